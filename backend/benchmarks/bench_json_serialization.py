@@ -0,0 +1,76 @@
+"""
+Micro-benchmark: serializing a GET /api/orders/all page of realistic orders
+
+Compares FastAPI's old default (jsonable_encoder + stdlib json), ORJSONResponse behind jsonable_encoder
+(what plain dict-returning handlers now get) and server.json_response (orjson only, used by hot lists):
+    python benchmarks/bench_json_serialization.py
+
+Tunables (env): BENCH_ORDERS, BENCH_ROUNDS
+"""
+import os
+import sys
+import json
+import time
+from pathlib import Path
+from datetime import datetime, timezone
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from common import summarize
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+import server  # noqa: E402
+from datagen import Generator  # noqa: E402
+
+ORDERS = int(os.environ.get('BENCH_ORDERS', '500'))
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '200'))
+
+EXTRAS = [{"name": "Extra Chapati", "qty": 2, "price": 10}, {"name": "Gulab Jamun", "qty": 1, "price": 20}]
+
+
+def make_orders(n):
+    """Orders as Motor returns them: aware datetimes, nested items, Marathi customer names"""
+    gen = Generator(seed=7, now=datetime.now(timezone.utc), days=30)
+    customers = gen.customers(100, "x")
+    orders = gen.orders(n, customers, np.full(len(customers), 1 / len(customers)))
+    for i, order in enumerate(orders):
+        order.pop("_id", None)
+        order["items"] = order["items"] + EXTRAS[: i % 3]
+        order["user_name"] = f"{order['user_name']} (ग्राहक)"
+    return orders
+
+
+def measure(fn):
+    fn()
+    latencies = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def main():
+    orders = make_orders(ORDERS)
+    paths = {
+        "jsonable_encoder + json (JSONResponse)": lambda: JSONResponse(jsonable_encoder(orders)).body,
+        "jsonable_encoder + orjson (ORJSONResponse)": lambda: ORJSONResponse(jsonable_encoder(orders)).body,
+        "orjson only (server.json_response)": lambda: server.json_response(orders).body,
+    }
+    bodies = {name: json.loads(fn()) for name, fn in paths.items()}
+    assert all(body == next(iter(bodies.values())) for body in bodies.values()), "serializers disagree"
+
+    results = {"orders": ORDERS, "rounds": ROUNDS, "body_bytes": len(server.json_response(orders).body)}
+    for name, fn in paths.items():
+        results[name] = measure(fn)
+    baseline = results["jsonable_encoder + json (JSONResponse)"]["p50_ms"]
+    for name in paths:
+        results[name]["speedup_p50"] = round(baseline / results[name]["p50_ms"], 1)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
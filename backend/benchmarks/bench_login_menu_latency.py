@@ -0,0 +1,76 @@
+"""
+Load benchmark: p99 latency of GET /api/menu while logins hammer bcrypt
+
+Run against a live server (uvicorn server:app) that has been seeded via POST /api/seed:
+    BENCH_BASE_URL=http://localhost:8001 python benchmarks/bench_login_menu_latency.py
+
+Tunables (env): BENCH_LOGIN_WORKERS, BENCH_MENU_WORKERS, BENCH_DURATION_SECONDS
+"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from common import summarize
+
+BASE_URL = os.environ.get('BENCH_BASE_URL', 'http://localhost:8001')
+LOGIN_WORKERS = int(os.environ.get('BENCH_LOGIN_WORKERS', '32'))
+MENU_WORKERS = int(os.environ.get('BENCH_MENU_WORKERS', '8'))
+DURATION_SECONDS = float(os.environ.get('BENCH_DURATION_SECONDS', '20'))
+
+CUSTOMER = {"email": "rahul@test.com", "password": "test123"}
+
+
+def run_loop(deadline, fn, latencies, statuses, lock):
+    session = requests.Session()
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        status = fn(session)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+
+def do_login(session):
+    return session.post(f"{BASE_URL}/api/auth/login", json=CUSTOMER).status_code
+
+
+def do_menu(session):
+    return session.get(f"{BASE_URL}/api/menu", params={"day": "monday"}).status_code
+
+
+def phase(login_workers):
+    """Measure /api/menu latency with `login_workers` threads logging in concurrently"""
+    lock = threading.Lock()
+    menu_latencies, login_latencies = [], []
+    menu_statuses, login_statuses = {}, {}
+    deadline = time.perf_counter() + DURATION_SECONDS
+    with ThreadPoolExecutor(max_workers=login_workers + MENU_WORKERS) as pool:
+        for _ in range(login_workers):
+            pool.submit(run_loop, deadline, do_login, login_latencies, login_statuses, lock)
+        for _ in range(MENU_WORKERS):
+            pool.submit(run_loop, deadline, do_menu, menu_latencies, menu_statuses, lock)
+    return {
+        "login_workers": login_workers,
+        "menu": {**summarize(menu_latencies), "statuses": menu_statuses},
+        "login": {**summarize(login_latencies), "statuses": login_statuses},
+    }
+
+
+def main():
+    requests.post(f"{BASE_URL}/api/seed")
+    results = {
+        "base_url": BASE_URL,
+        "duration_seconds": DURATION_SECONDS,
+        "baseline": phase(0),
+        "under_login_load": phase(LOGIN_WORKERS),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
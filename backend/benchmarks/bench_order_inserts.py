@@ -0,0 +1,130 @@
+"""
+Benchmark: POST /orders write throughput with a round trip per write vs. group commit (WriteBatcher)
+
+Simulates a lunch-hour burst: `--concurrency` callers each create orders back to back through the same
+path as the handler (run_idempotent + insert_order, so the Idempotency-Key claim and completion, the
+order insert and the analytics and materialized-stats counter updates are all included) against a
+freshly indexed database. Against a local mongod (the database named by --db is dropped):
+    python benchmarks/bench_order_inserts.py --mongo-url mongodb://localhost:27017 --concurrency 16 64 256
+
+Batcher settings are swept with --max-batch and --linger-ms. --stand-in uses mongomock-motor, which
+only checks that every mode completes; its numbers say nothing about a real server.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from pathlib import Path
+
+from common import summarize
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+BATCHERS = {
+    "order_writes": "orders",
+    "stats_writes": "stats",
+    "analytics_writes": "analytics_rollups",
+    "idempotency_writes": "idempotency_keys",
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="gurukrupa_bench_inserts")
+    parser.add_argument("--stand-in", action="store_true", help="use mongomock-motor instead of a real mongod")
+    parser.add_argument("--orders", type=int, default=20000, help="orders created per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--linger-ms", type=float, nargs="+", default=[1.0, 2.0, 5.0])
+    return parser.parse_args()
+
+
+def load_server(args):
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["DB_NAME"] = args.db
+    os.environ["MATERIALIZED_STATS"] = "true"
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    if args.stand_in:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--stand-in needs mongomock-motor: pip install mongomock-motor")
+        server.client = AsyncMongoMockClient(tz_aware=True)
+        server.db = server.client[args.db]
+        server.read_db = server.db
+    return server
+
+
+def configure(server, max_batch, linger_ms):
+    """Switch insert_order between direct writes (linger_ms None) and fresh batchers"""
+    server.ORDER_INSERT_BATCHING = linger_ms is not None
+    batchers = []
+    for name, collection in BATCHERS.items():
+        batcher = server.WriteBatcher(collection, max_batch, linger_ms or 0)
+        setattr(server, name, batcher)
+        batchers.append(batcher)
+    return batchers
+
+
+async def burst(server, orders, concurrency):
+    """`concurrency` callers share `orders` creations; returns wall time and per-order latencies"""
+    remaining = iter(range(orders))
+    latencies = []
+    data = server.OrderCreate(items=[{"name": "Lunch Tiffin", "qty": 1}], order_type="single")
+
+    async def caller(n):
+        user = {"id": f"bench-user-{n}", "name": "Bench Customer", "phone": "9000000000", "address": "Kothrud, Pune"}
+        for _ in remaining:
+            start = time.perf_counter()
+            await server.run_idempotent("orders", user["id"], str(uuid.uuid4()), data.dict(),
+                                        lambda: server.insert_order(data, user))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller(n) for n in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+async def reset(server):
+    for collection in ("orders", "stats", "analytics_rollups", "idempotency_keys"):
+        await server.db[collection].drop()
+    await server.ensure_indexes()
+    server.idempotency_cache.clear()
+
+
+async def main():
+    args = parse_args()
+    server = load_server(args)
+    await server.client.drop_database(args.db)
+    results = {"orders": args.orders, "max_batch": args.max_batch, "runs": []}
+    for concurrency in args.concurrency:
+        modes = [("direct", None)] + [(f"batched linger={ms}ms", ms) for ms in args.linger_ms]
+        baseline = None
+        for name, linger_ms in modes:
+            await reset(server)
+            batchers = configure(server, args.max_batch, linger_ms)
+            elapsed, latencies = await burst(server, args.orders, concurrency)
+            for batcher in batchers:
+                await batcher.drain()
+            assert await server.db.orders.count_documents({}) == args.orders, f"{name}: orders went missing"
+            stats = await server.db.stats.find_one({"_id": server.STATS_ID})
+            assert stats and stats["orders_total"] == args.orders, f"{name}: stats counter drifted"
+            throughput = args.orders / elapsed
+            baseline = baseline or throughput
+            run = {
+                "concurrency": concurrency, "mode": name, "orders_per_second": round(throughput),
+                "speedup": round(throughput / baseline, 2), **summarize(latencies),
+            }
+            results["runs"].append(run)
+            print(json.dumps(run), flush=True)
+    await server.client.drop_database(args.db)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
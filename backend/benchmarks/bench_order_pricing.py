@@ -0,0 +1,49 @@
+"""
+Micro-benchmark: server-side pricing of a typical order against the in-memory price table
+
+    python benchmarks/bench_order_pricing.py
+
+Tunables (env): BENCH_ROUNDS
+"""
+import os
+import sys
+import json
+import time
+from pathlib import Path
+
+from common import percentile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+import server  # noqa: E402
+
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '100000'))
+BATCH = 1000
+
+ORDER = [{"name": "Lunch Tiffin", "qty": 2}, {"name": "gulab jamun", "qty": 1}, {"id": "plan-weekly", "qty": 1}]
+
+
+def main():
+    # Same shape PriceTable._rebuild produces for a seeded catalogue
+    prices = {name.lower(): (name, price) for name, price in server.MEAL_PRICES.items()}
+    prices["gulab jamun"] = ("Gulab Jamun", 20)
+    prices["plan-weekly"] = ("Weekly Plan", 500)
+    for i in range(200):
+        prices[f"dish {i}"] = (f"Dish {i}", 10 + i)
+
+    lines, total = server.price_order(ORDER, prices)
+    # Single calls are below timer resolution, so time batches and report per-call microseconds
+    latencies = []
+    for _ in range(ROUNDS // BATCH):
+        start = time.perf_counter()
+        for _ in range(BATCH):
+            server.price_order(ORDER, prices)
+        latencies.append((time.perf_counter() - start) / BATCH)
+    print(json.dumps({
+        "items_per_order": len(ORDER), "price_table_entries": len(prices), "total": total,
+        "calls": ROUNDS, "p50_us": round(percentile(latencies, 50) * 1e6, 2), "p99_us": round(percentile(latencies, 99) * 1e6, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Reproducible load test: boots server.app in-process, seeds synthetic data and drives mixed traffic
+
+Against a local mongod (the database named by --db is dropped and reseeded):
+    python benchmarks/loadtest.py --mongo-url mongodb://localhost:27017 --concurrency 32 --duration 30
+
+Data comes from datagen.bulk_seed (see datagen.py). Without a mongod, using an in-memory stand-in (pip install mongomock-motor):
+    python benchmarks/loadtest.py --stand-in
+
+Results are written as JSON (--output); pass --baseline <previous.json> to print per-endpoint deltas.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+
+import httpx
+
+from common import summarize
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# (name, weight, role, method, path builder, json body builder)
+SCENARIOS = [
+    ("GET /api/menu?day", 30, None, "GET", lambda rnd: f"/api/menu?day={rnd.choice(DAYS)}", None),
+    ("GET /api/menu/weekly", 10, None, "GET", lambda rnd: "/api/menu/weekly", None),
+    ("GET /api/plans", 10, None, "GET", lambda rnd: "/api/plans", None),
+    ("GET /api/auth/me", 10, "customer", "GET", lambda rnd: "/api/auth/me", None),
+    ("GET /api/orders", 15, "customer", "GET", lambda rnd: "/api/orders?limit=20", None),
+    ("GET /api/subscriptions", 5, "customer", "GET", lambda rnd: "/api/subscriptions", None),
+    ("POST /api/orders", 10, "customer", "POST", lambda rnd: "/api/orders",
+     lambda rnd: {"items": [{"name": "Lunch Tiffin", "qty": rnd.randint(1, 3)}], "order_type": "single"}),
+    ("GET /api/orders/all", 5, "admin", "GET", lambda rnd: "/api/orders/all?limit=50", None),
+    ("GET /api/admin/dashboard", 5, "admin", "GET", lambda rnd: "/api/admin/dashboard", None),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="gurukrupa_loadtest")
+    parser.add_argument("--stand-in", action="store_true", help="use mongomock-motor instead of a real mongod")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--menu-items", type=int, default=60)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--subscriptions", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of measured traffic")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unmeasured traffic first")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for data and traffic")
+    parser.add_argument("--output", default=None, help="JSON results path (default: benchmarks/results/)")
+    parser.add_argument("--baseline", default=None, help="previous results JSON to compare against")
+    return parser.parse_args()
+
+
+# Background jobs would scan and rewrite the data while it is seeded and measured
+BACKGROUND_JOBS_OFF = {
+    "MANIFEST_INTERVAL_SECONDS": "0",
+    "ARCHIVE_INTERVAL_SECONDS": "0",
+    "STATS_RECONCILE_INTERVAL_SECONDS": "0",
+    "MIGRATE_TIMESTAMPS_ON_STARTUP": "false",
+}
+
+
+def load_server(args):
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["DB_NAME"] = args.db
+    os.environ.update(BACKGROUND_JOBS_OFF)
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if args.stand_in:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--stand-in needs mongomock-motor: pip install mongomock-motor")
+        server.client = AsyncMongoMockClient(tz_aware=True)
+        server.db = server.client[args.db]
+        server.read_db = server.db
+    return server
+
+
+async def seed(server, args):
+    from datagen import bulk_seed
+
+    await server.client.drop_database(args.db)
+    password_hash = await server.hash_password("loadtest123")
+    admin = {
+        "id": str(uuid.uuid4()), "name": "Admin", "email": "admin@loadtest.local", "phone": "9000000000",
+        "password_hash": password_hash, "address": "", "role": "admin", "language_pref": "en",
+        "created_at": server.utc_now(),
+    }
+    await server.db.users.insert_one(admin)
+    _, customers = await bulk_seed(
+        server.db, password_hash, customers=args.users, orders=args.orders, subscriptions=args.subscriptions,
+        menu_items=args.menu_items, seed=args.seed,
+    )
+    server.menu_snapshot.invalidate()
+    return {
+        "admin": [server.create_token(admin["id"], "admin")],
+        "customer": [server.create_token(c["id"], "customer") for c in customers[:200]],
+    }
+
+
+async def worker(client, rnd, tokens, deadline, measure_from, samples, errors):
+    names = [s[0] for s in SCENARIOS]
+    weights = [s[1] for s in SCENARIOS]
+    by_name = {s[0]: s for s in SCENARIOS}
+    while time.perf_counter() < deadline:
+        name, _, role, method, path, body = by_name[rnd.choices(names, weights)[0]]
+        headers = {"Authorization": f"Bearer {rnd.choice(tokens[role])}"} if role else {}
+        start = time.perf_counter()
+        response = await client.request(method, path(rnd), headers=headers,
+                                        json=body(rnd) if body else None)
+        elapsed = time.perf_counter() - start
+        if start < measure_from:
+            continue
+        samples.setdefault(name, []).append(elapsed)
+        if response.status_code >= 400:
+            errors[name] = errors.get(name, 0) + 1
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\nvs baseline {baseline.get('git_revision')} ({baseline_path}):")
+    for name, current in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        print(f"  {name:28s} p99 {before['p99_ms']:8.2f} -> {current['p99_ms']:8.2f} ms   "
+              f"rps {before['rps']:8.1f} -> {current['rps']:8.1f}")
+
+
+async def run(args):
+    server = load_server(args)
+    seed_started = time.perf_counter()
+    tokens = await seed(server, args)
+    # Run the analytics backfill up front so startup finds it done instead of aggregating during the run
+    await server.init_analytics()
+    await server.run_startup_jobs()
+    seed_seconds = time.perf_counter() - seed_started
+    # Startup builds the indexes on the freshly seeded collections
+    await server.app.router.startup()
+    try:
+        samples, errors = {}, {}
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            measure_from = time.perf_counter() + args.warmup
+            deadline = measure_from + args.duration
+            await asyncio.gather(*[
+                worker(client, random.Random(args.seed + i + 1), tokens, deadline, measure_from, samples, errors)
+                for i in range(args.concurrency)
+            ])
+    finally:
+        await server.app.router.shutdown()
+
+    endpoints = {}
+    for name, latencies in sorted(samples.items()):
+        endpoints[name] = {**summarize(latencies), "rps": round(len(latencies) / args.duration, 1),
+                           "errors": errors.get(name, 0)}
+    all_latencies = [x for latencies in samples.values() for x in latencies]
+    return {
+        "git_revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "seed_seconds": round(seed_seconds, 2),
+        "total": {**summarize(all_latencies), "rps": round(len(all_latencies) / args.duration, 1),
+                  "errors": sum(errors.values())},
+        "endpoints": endpoints,
+    }
+
+
+def main():
+    args = parse_args()
+    results = asyncio.run(run(args))
+    output = Path(args.output) if args.output else RESULTS_DIR / f"loadtest-{results['git_revision'] or 'local'}-{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+
+    print(f"{'endpoint':28s} {'rps':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'err':>5s}")
+    for name, row in results["endpoints"].items():
+        print(f"{name:28s} {row['rps']:8.1f} {row['p50_ms']:8.2f} {row['p95_ms']:8.2f} {row['p99_ms']:8.2f} {row['errors']:5d}")
+    total = results["total"]
+    print(f"{'TOTAL':28s} {total['rps']:8.1f} {total['p50_ms']:8.2f} {total['p95_ms']:8.2f} {total['p99_ms']:8.2f} {total['errors']:5d}")
+    print(f"\nresults written to {output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
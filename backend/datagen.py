@@ -0,0 +1,274 @@
+"""
+Bulk synthetic data generator for capacity planning and load tests
+
+    python datagen.py --customers 20000 --orders 1000000 --subscriptions 5000 --days 180
+
+Writes into the database configured by MONGO_URL / DB_NAME (same .env as the server). Documents follow
+the shapes the API writes, with skewed customer activity, lunch/dinner ordering peaks, quieter Sundays
+and age-dependent order statuses. Random draws are vectorized with NumPy per batch, every customer
+shares one bcrypt hash, and batches go out as unordered insert_many calls with a few in flight at once.
+"""
+import time
+import uuid
+import asyncio
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+BATCH_SIZE = 10_000
+MAX_INFLIGHT_BATCHES = 4
+DEFAULT_PASSWORD = "test123"
+
+FIRST_NAMES = ["Rahul", "Sneha", "Amit", "Priya", "Omkar", "Pooja", "Sachin", "Aarti", "Vishal", "Neha",
+               "Aditya", "Shruti", "Nikhil", "Kavya", "Rohan", "Sayali", "Tushar", "Ankita", "Prasad", "Rutuja"]
+LAST_NAMES = ["Patil", "Deshmukh", "Kulkarni", "Joshi", "Pawar", "Shinde", "Jadhav", "More", "Gaikwad", "Kale",
+              "Chavan", "Bhosale", "Deshpande", "Salunkhe", "Kadam"]
+AREAS = ["Kothrud", "Karve Nagar", "Deccan", "Shivajinagar", "Aundh", "Baner", "Hadapsar", "Wakad",
+         "Warje", "Erandwane", "Sinhagad Road", "Pashan"]
+AREA_WEIGHTS = [0.18, 0.12, 0.08, 0.08, 0.07, 0.09, 0.07, 0.06, 0.08, 0.06, 0.06, 0.05]
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+CATEGORIES = ["rice", "roti", "sabzi", "dal", "sweet", "salad", "extra"]
+
+DEFAULT_PLANS = [
+    ("Weekly Plan", "साप्ताहिक प्लॅन", 490, 7, 1),
+    ("Monthly Plan", "मासिक प्लॅन", 1800, 30, 1),
+    ("Monthly - 2 Meals", "मासिक - २ जेवण", 3200, 30, 2),
+]
+PLAN_POPULARITY = [0.4, 0.45, 0.15]
+
+ORDER_TYPES = ["single", "subscription", "dine_in"]
+ORDER_TYPE_WEIGHTS = [0.7, 0.2, 0.1]
+LIVE_STATUSES = ["pending", "preparing", "out_for_delivery", "delivered", "cancelled"]
+
+
+def utc(ts: float) -> datetime:
+    """Epoch seconds -> aware UTC datetime at the millisecond precision BSON dates keep"""
+    return datetime.fromtimestamp(round(float(ts), 3), timezone.utc)
+
+
+class Generator:
+    """Vectorized document factories sharing one seeded NumPy generator"""
+
+    def __init__(self, seed: int, now: datetime, days: int):
+        self.rng = np.random.default_rng(seed)
+        self.now = now.timestamp()
+        self.days = days
+
+    def ids(self, n: int):
+        raw = self.rng.bytes(16 * n)
+        return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * n, 16)]
+
+    def timestamps(self, n: int):
+        """Order times over the last `days` days: lunch and dinner peaks, quieter Sundays"""
+        weekday_weight = np.array([1.0, 1.0, 1.0, 1.0, 1.05, 0.9, 0.6])
+        day_starts = np.floor(self.now / 86400 - np.arange(self.days)) * 86400
+        weekdays = ((day_starts // 86400).astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+        p = weekday_weight[weekdays]
+        day = day_starts[self.rng.choice(self.days, size=n, p=p / p.sum())]
+        slot = self.rng.choice(3, size=n, p=[0.6, 0.3, 0.1])
+        # Times are UTC; IST lunch 12:30 = 07:00 UTC, dinner 20:00 = 14:30 UTC
+        seconds = np.where(
+            slot == 0, self.rng.normal(7.0 * 3600, 2700, n),
+            np.where(slot == 1, self.rng.normal(14.5 * 3600, 2400, n), self.rng.uniform(2.5 * 3600, 16.5 * 3600, n)),
+        )
+        ts = day + np.clip(seconds, 0, 86399)
+        # Later today has not happened yet - move those draws to the same time yesterday
+        return np.where(ts >= self.now, ts - 86400, ts), slot
+
+    def customers(self, n: int, password_hash: str, offset: int = 0):
+        first = self.rng.choice(FIRST_NAMES, n)
+        last = self.rng.choice(LAST_NAMES, n)
+        areas = self.rng.choice(AREAS, n, p=AREA_WEIGHTS)
+        phones = self.rng.integers(7_000_000_000, 9_999_999_999, n)
+        flats = self.rng.integers(1, 1200, n)
+        lang = self.rng.choice(["en", "mr"], n, p=[0.7, 0.3])
+        created = self.now - self.rng.uniform(0, self.days * 86400, n)
+        return [{
+            "id": cid,
+            "name": f"{first[i]} {last[i]}",
+            "email": f"{str(first[i]).lower()}.{str(last[i]).lower()}.{offset + i}@example.com",
+            "phone": str(phones[i]),
+            "password_hash": password_hash,
+            "address": f"Flat {flats[i]}, {areas[i]}, Pune",
+            "role": "customer",
+            "language_pref": str(lang[i]),
+            "created_at": utc(created[i]),
+        } for i, cid in enumerate(self.ids(n))]
+
+    def menu_items(self, n: int):
+        days = self.rng.choice(DAYS + ["daily"], n, p=[0.11] * 7 + [0.23])
+        categories = self.rng.choice(CATEGORIES, n)
+        now = utc(self.now)
+        return [{
+            "id": mid, "name_en": f"Dish {i}", "name_mr": f"पदार्थ {i}", "description_en": "", "description_mr": "",
+            "category": str(categories[i]), "price": 0, "day_of_week": str(days[i]), "is_available": True,
+            "image_url": "", "created_at": now, "updated_at": now,
+        } for i, mid in enumerate(self.ids(n))]
+
+    def plans(self):
+        now = utc(self.now)
+        return [{
+            "id": pid, "name_en": en, "name_mr": mr, "description_en": en, "description_mr": mr, "price": price,
+            "duration_days": days, "meals_per_day": meals, "is_active": True, "created_at": now, "updated_at": now,
+        } for pid, (en, mr, price, days, meals) in zip(self.ids(len(DEFAULT_PLANS)), DEFAULT_PLANS)]
+
+    def orders(self, n: int, customers: list, activity: np.ndarray):
+        """One batch of orders; `activity` skews how often each customer orders"""
+        who = self.rng.choice(len(customers), size=n, p=activity)
+        ts, slot = self.timestamps(n)
+        order_type = self.rng.choice(3, size=n, p=ORDER_TYPE_WEIGHTS)
+        qty = self.rng.choice([1, 2, 3], size=n, p=[0.75, 0.2, 0.05])
+        age_hours = (self.now - ts) / 3600
+        settled = np.where(self.rng.random(n) < 0.94, 3, 4)  # delivered / cancelled
+        live = np.minimum((age_hours / 1.5).astype(np.int64), 3)
+        status = np.where(age_hours > 24, settled, np.where(self.rng.random(n) < 0.03, 4, live))
+        docs = []
+        for i, oid in enumerate(self.ids(n)):
+            c = customers[who[i]]
+            kind = ORDER_TYPES[order_type[i]]
+            if kind == "dine_in":
+                item, price, address = "Dine-In Unlimited Thali", 80, "Dine-In at Gurukrupa Mess"
+            elif slot[i] == 1:
+                item, price, address = "Dinner Tiffin", 90, c["address"]
+            else:
+                item, price, address = "Lunch Tiffin", 80, c["address"]
+            q = int(qty[i])
+            created = utc(ts[i])
+            docs.append({
+                "id": oid,
+                "user_id": c["id"],
+                "user_name": c["name"],
+                "user_phone": c["phone"],
+                "items": [{"name": item, "qty": q, "price": price}],
+                "total": price * q,
+                "order_type": kind,
+                "delivery_address": address,
+                "notes": "",
+                "status": LIVE_STATUSES[status[i]],
+                "payment_status": "paid",
+                "created_at": created,
+                "updated_at": created,
+            })
+        return docs
+
+    def subscriptions(self, n: int, customers: list, plans: list):
+        who = self.rng.choice(len(customers), size=n)
+        which = self.rng.choice(len(plans), size=n, p=PLAN_POPULARITY if len(plans) == 3 else None)
+        starts = self.now - self.rng.uniform(0, self.days * 86400, n)
+        docs = []
+        for i, sid in enumerate(self.ids(n)):
+            c, plan = customers[who[i]], plans[which[i]]
+            end = starts[i] + plan["duration_days"] * 86400
+            docs.append({
+                "id": sid,
+                "user_id": c["id"],
+                "user_name": c["name"],
+                "plan_id": plan["id"],
+                "plan_name_en": plan.get("name_en", ""),
+                "plan_name_mr": plan.get("name_mr", ""),
+                "price": plan["price"],
+                "start_date": utc(starts[i]),
+                "end_date": utc(end),
+                "status": "active" if end > self.now else "expired",
+                "payment_status": "paid",
+                "created_at": utc(starts[i]),
+                "updated_at": utc(starts[i]),
+            })
+        return docs
+
+
+async def insert_batches(collection, batches):
+    """insert_many(ordered=False) per batch, keeping a few batches in flight while the next is generated"""
+    inflight = set()
+    total = 0
+    for batch in batches:
+        if not batch:
+            continue
+        if len(inflight) >= MAX_INFLIGHT_BATCHES:
+            done, inflight = await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        inflight.add(asyncio.ensure_future(collection.insert_many(batch, ordered=False)))
+        total += len(batch)
+        await asyncio.sleep(0)
+    if inflight:
+        for task in await asyncio.gather(*inflight, return_exceptions=True):
+            if isinstance(task, Exception):
+                raise task
+    return total
+
+
+def chunks(total: int, size: int = BATCH_SIZE):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+async def bulk_seed(db, password_hash: str, customers: int = 1000, orders: int = 10000, subscriptions: int = 500,
+                    menu_items: int = 0, days: int = 90, seed: int = 42, now: datetime = None):
+    """Generate and insert synthetic data; returns per-collection counts and the generated customers"""
+    gen = Generator(seed, now or datetime.now(timezone.utc), days)
+    counts = {}
+    users = []
+
+    def customer_batches():
+        for start, size in chunks(customers):
+            batch = gen.customers(size, password_hash, offset=start)
+            users.extend({k: u[k] for k in ("id", "name", "phone", "address")} for u in batch)
+            yield batch
+    counts["customers"] = await insert_batches(db.users, customer_batches())
+    if menu_items:
+        counts["menu_items"] = await insert_batches(db.menu_items, [gen.menu_items(menu_items)])
+
+    plans = await db.subscription_plans.find({"is_active": True}, {"_id": 0}).to_list(None)
+    if not plans:
+        plans = gen.plans()
+        await db.subscription_plans.insert_many([dict(p) for p in plans], ordered=False)
+        counts["plans"] = len(plans)
+
+    if users and orders:
+        activity = gen.rng.lognormal(0, 1.0, len(users))
+        activity /= activity.sum()
+        counts["orders"] = await insert_batches(
+            db.orders, (gen.orders(size, users, activity) for _, size in chunks(orders))
+        )
+    if users and subscriptions:
+        counts["subscriptions"] = await insert_batches(
+            db.subscriptions, (gen.subscriptions(size, users, plans) for _, size in chunks(subscriptions))
+        )
+    return counts, users
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--subscriptions", type=int, default=500)
+    parser.add_argument("--menu-items", type=int, default=0)
+    parser.add_argument("--days", type=int, default=90, help="spread orders over this many past days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="shared password for generated customers")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    import server
+
+    await server.ensure_indexes()
+    password_hash = server.pwd_context.hash(args.password)
+    started = time.perf_counter()
+    counts, _ = await bulk_seed(
+        server.db, password_hash, customers=args.customers, orders=args.orders,
+        subscriptions=args.subscriptions, menu_items=args.menu_items, days=args.days, seed=args.seed,
+    )
+    elapsed = time.perf_counter() - started
+    for name, count in counts.items():
+        print(f"{name:14s} {count:>10,d}")
+    print(f"done in {elapsed:.1f}s")
+    server.client.close()
+    server.password_executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
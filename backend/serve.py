@@ -0,0 +1,32 @@
+"""
+Production entry point: serves server:app from several uvicorn worker processes
+
+    WEB_CONCURRENCY=4 PORT=8001 python serve.py
+
+With more than one worker the per-process caches (menu snapshot, user cache, kitchen forecast) and
+the in-process order feed are kept coherent by the cache bus in server.py, which this script enables
+(CACHE_BUS_ENABLED). Periodic jobs take a lease in MongoDB so only one worker runs each of them.
+Every worker has its own Mongo pool and password-hashing pool, so size MONGO_MAX_POOL_SIZE and
+PASSWORD_HASH_WORKERS per worker.
+"""
+import os
+from pathlib import Path
+
+import uvicorn
+
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', '8001'))
+WORKERS = int(os.environ.get('WEB_CONCURRENCY', str(os.cpu_count() or 1)))
+
+
+def main():
+    if WORKERS > 1:
+        os.environ.setdefault('CACHE_BUS_ENABLED', 'true')
+    uvicorn.run(
+        "server:app", app_dir=str(Path(__file__).resolve().parent), host=HOST, port=PORT, workers=WORKERS,
+        proxy_headers=True, forwarded_allow_ips="*",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,397 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, Header
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ASCENDING, DESCENDING, CursorType, ReturnDocument, ReadPreference, InsertOne, UpdateOne, ReplaceOne, monitoring
+from pymongo.errors import OperationFailure, DuplicateKeyError, CollectionInvalid, BulkWriteError, WriteError, WriteConcernError
 import os
+import io
+import csv
+import zlib
+import heapq
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel
 from typing import List, Optional
 import uuid
+import time
+import json
+import orjson
+import base64
+import hashlib
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from itertools import islice
 from datetime import datetime, timezone, timedelta
+import numpy as np
+import pandas as pd
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Prometheus-style instrumentation; when disabled neither the middleware nor the Mongo listener is installed
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+# ============ METRICS ============
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+MONGO_CALL_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+class MetricsRegistry:
+    """Minimal thread-safe counters, gauges and histograms rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def describe(self, name: str, kind: str, help_text: str, buckets=None):
+        self._help[name] = (kind, help_text, buckets)
+
+    def inc(self, name: str, labels: tuple, value: float = 1):
+        with self._lock:
+            key = (name, labels)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge_set(self, name: str, labels: tuple, value: float):
+        with self._lock:
+            self._gauges[(name, labels)] = value
+
+    def gauge_add(self, name: str, labels: tuple, value: float):
+        with self._lock:
+            key = (name, labels)
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def observe(self, name: str, labels: tuple, value: float):
+        buckets = self._help[name][2]
+        with self._lock:
+            key = (name, labels)
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * len(buckets) + [0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @staticmethod
+    def _labels(labels: tuple, le=None) -> str:
+        parts = []
+        for key, value in labels:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+            parts.append(f'{key}="{value}"')
+        if le is not None:
+            parts.append(f'le="{le}"')
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        lines = []
+        for name, (kind, help_text, buckets) in self._help.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for (series_name, labels), series in histograms.items():
+                    if series_name != name:
+                        continue
+                    for bound, count in zip(buckets, series):
+                        lines.append(f"{name}_bucket{self._labels(labels, bound)} {count}")
+                    lines.append(f"{name}_bucket{self._labels(labels, '+Inf')} {series[-1]}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {series[-2]}")
+                    lines.append(f"{name}_count{self._labels(labels)} {series[-1]}")
+            else:
+                source = counters if kind == "counter" else gauges
+                for (series_name, labels), value in source.items():
+                    if series_name == name:
+                        lines.append(f"{name}{self._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+metrics.describe("http_requests_total", "counter", "HTTP requests by route and status")
+metrics.describe("http_requests_in_flight", "gauge", "HTTP requests currently being served")
+metrics.describe("http_request_duration_seconds", "histogram", "HTTP request latency", LATENCY_BUCKETS)
+metrics.describe("http_response_size_bytes", "histogram", "HTTP response body size", SIZE_BUCKETS)
+metrics.describe("http_request_mongo_commands", "histogram", "MongoDB commands issued per HTTP request", MONGO_CALL_BUCKETS)
+metrics.describe("mongo_commands_total", "counter", "MongoDB commands by originating route")
+metrics.describe("mongo_command_failures_total", "counter", "Failed MongoDB commands by originating route")
+metrics.describe("mongo_command_duration_seconds_total", "counter", "Time spent in MongoDB commands by originating route")
+metrics.describe("mongo_pool_open_connections", "gauge", "Open MongoDB connections per server")
+metrics.describe("mongo_pool_checked_out_connections", "gauge", "MongoDB connections currently checked out per server")
+metrics.describe("mongo_pool_waiting_requests", "gauge", "Operations waiting for a pooled MongoDB connection per server")
+metrics.describe("mongo_pool_checkout_failures_total", "counter", "Connection checkouts that failed or timed out per server")
+metrics.describe("write_batch_size", "histogram", "Operations per coalesced bulk_write by collection", BATCH_SIZE_BUCKETS)
+
+class RequestMetrics:
+    __slots__ = ("scope", "mongo_commands")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.mongo_commands = 0
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or "<unmatched>"
+
+_request_metrics = contextvars.ContextVar("request_metrics", default=None)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Attributes each Mongo command to the HTTP route whose handler issued it (Motor copies the context)"""
+
+    def _record(self, event, failed: bool):
+        current = _request_metrics.get()
+        route = current.route if current else "<background>"
+        if current:
+            current.mongo_commands += 1
+        labels = (("route", route), ("command", event.command_name))
+        metrics.inc("mongo_commands_total", labels)
+        metrics.inc("mongo_command_duration_seconds_total", labels, event.duration_micros / 1e6)
+        if failed:
+            metrics.inc("mongo_command_failures_total", labels)
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Live connection-pool occupancy per server, fed by the driver's CMAP events (called from driver threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = {}
+
+    def _update(self, event, **deltas):
+        address = "%s:%s" % event.address
+        with self._lock:
+            server = self._servers.setdefault(
+                address, {"open": 0, "checked_out": 0, "waiting": 0, "checkout_failures": 0, "cleared": 0}
+            )
+            for key, delta in deltas.items():
+                server[key] = max(0, server[key] + delta)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {address: dict(server) for address, server in self._servers.items()}
+
+    def pool_created(self, event):
+        self._update(event)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event, cleared=1)
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._servers.pop("%s:%s" % event.address, None)
+
+    def connection_created(self, event):
+        self._update(event, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._update(event, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event, waiting=-1, checkout_failures=1)
+        metrics.inc("mongo_pool_checkout_failures_total", (("server", "%s:%s" % event.address),))
+
+    def connection_checked_out(self, event):
+        self._update(event, waiting=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._update(event, checked_out=-1)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status, response size and Mongo calls per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        current = RequestMetrics(scope)
+        token = _request_metrics.set(current)
+        state = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        metrics.gauge_add("http_requests_in_flight", (), 1)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.gauge_add("http_requests_in_flight", (), -1)
+            _request_metrics.reset(token)
+            labels = (("method", scope["method"]), ("route", current.route))
+            metrics.inc("http_requests_total", labels + (("status", str(state["status"])),))
+            metrics.observe("http_request_duration_seconds", labels, elapsed)
+            metrics.observe("http_response_size_bytes", labels, state["size"])
+            metrics.observe("http_request_mongo_commands", labels, current.mongo_commands)
+
+# MongoDB connection: pool size and timeouts are bounded so a slow or unreachable server fails
+# requests quickly instead of queueing them indefinitely
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_CONNECTING = int(os.environ.get('MONGO_MAX_CONNECTING', '2'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '10000'))
+# Read preference for read-only routes that tolerate replication lag (plans, dashboard, exports, manifests)
+MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'secondaryPreferred')
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+if MONGO_READ_PREFERENCE not in READ_PREFERENCES:
+    raise ValueError(f"MONGO_READ_PREFERENCE must be one of {', '.join(READ_PREFERENCES)}")
+
+pool_monitor = PoolMonitor()
+# tz_aware: stored dates come back as UTC-aware datetimes and serialize with their +00:00 offset
+client = AsyncIOMotorClient(
+    mongo_url,
+    tz_aware=True,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxConnecting=MONGO_MAX_CONNECTING,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    event_listeners=[pool_monitor] + ([MongoCommandMetrics()] if METRICS_ENABLED else []),
+)
 db = client[os.environ.get('DB_NAME', 'gurukrupa_mess')]
+# Same database, reads routed per MONGO_READ_PREFERENCE; only for queries that need not see the caller's own writes
+read_db = db.with_options(read_preference=READ_PREFERENCES[MONGO_READ_PREFERENCE])
 
 # JWT Config
 SECRET_KEY = os.environ.get('JWT_SECRET', 'gurukrupa-mess-secret-key-2024')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 72
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing: bcrypt runs on a bounded worker pool so it never blocks the event loop
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '4'))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '64'))
+PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', '2'))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwd-hash")
 security = HTTPBearer()
 
-app = FastAPI(title="Gurukrupa Mess API")
+# Authenticated-user cache
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', '10000'))
+# When enabled, read-only routes take identity and role straight from the JWT without a DB lookup
+TRUST_TOKEN_CLAIMS = os.environ.get('TRUST_TOKEN_CLAIMS', 'false').lower() in ('1', 'true', 'yes')
+
+# Dashboard statistics: when enabled, a single `stats` document is maintained incrementally by the
+# write paths and the dashboard becomes a point read; reconciliation recomputes it from scratch.
+MATERIALIZED_STATS = os.environ.get('MATERIALIZED_STATS', 'false').lower() in ('1', 'true', 'yes')
+STATS_RECONCILE_INTERVAL_SECONDS = float(os.environ.get('STATS_RECONCILE_INTERVAL_SECONDS', '0'))
+# Per-day order counters older than this are dropped from the stats document by reconciliation
+STATS_DAYS_KEPT = int(os.environ.get('STATS_DAYS_KEPT', '7'))
+
+# Admin order feed: "auto" uses a MongoDB change stream when the deployment supports it and falls
+# back to in-process publishing from the order handlers otherwise ("change_stream" / "local" force one)
+ORDER_FEED_SOURCE = os.environ.get('ORDER_FEED_SOURCE', 'auto')
+ORDER_FEED_BUFFER = int(os.environ.get('ORDER_FEED_BUFFER', '1000'))
+ORDER_FEED_KEEPALIVE_SECONDS = float(os.environ.get('ORDER_FEED_KEEPALIVE_SECONDS', '15'))
+
+# Exports stream straight off a cursor; only one batch of rows is ever held in memory
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+
+# Idempotency-Key support for POST /orders and /subscriptions
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+IDEMPOTENCY_PENDING_TIMEOUT_SECONDS = float(os.environ.get('IDEMPOTENCY_PENDING_TIMEOUT_SECONDS', '30'))
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_CACHE_MAX_ENTRIES', '10000'))
+# Pauses between attempts to record a completed request's response (see complete_idempotency_key)
+IDEMPOTENCY_COMPLETE_RETRY_DELAYS = (0.1, 0.5, 2.0)
+
+# Group commit for POST /orders (off by default): the order inserts, their dashboard/analytics counter
+# updates and the Idempotency-Key writes arriving within ORDER_INSERT_LINGER_MS of each other are
+# written with one unordered bulk_write per collection of at most ORDER_INSERT_MAX_BATCH operations
+ORDER_INSERT_BATCHING = os.environ.get('ORDER_INSERT_BATCHING', 'false').lower() in ('1', 'true', 'yes')
+ORDER_INSERT_MAX_BATCH = int(os.environ.get('ORDER_INSERT_MAX_BATCH', '64'))
+ORDER_INSERT_LINGER_MS = float(os.environ.get('ORDER_INSERT_LINGER_MS', '2'))
+
+# Kitchen forecast: results are cached until subscriptions, plans, the menu or past orders change
+FORECAST_CACHE_TTL_SECONDS = float(os.environ.get('FORECAST_CACHE_TTL_SECONDS', '3600'))
+
+# Multi-worker mode (serve.py turns the bus on when running more than one worker): cache invalidations
+# are fanned out through a capped collection, and a worker that has not heard from it for
+# CACHE_BUS_MAX_STALENESS_SECONDS stops serving from its caches until it catches up again
+CACHE_BUS_ENABLED = os.environ.get('CACHE_BUS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+CACHE_BUS_MAX_STALENESS_SECONDS = float(os.environ.get('CACHE_BUS_MAX_STALENESS_SECONDS', '2'))
+CACHE_BUS_POLL_MS = int(os.environ.get('CACHE_BUS_POLL_MS', '250'))
+CACHE_BUS_CAPPED_BYTES = int(os.environ.get('CACHE_BUS_CAPPED_BYTES', str(1024 * 1024)))
+
+# Delivery manifests: a background job expires finished subscriptions and materializes one
+# manifest row per delivery for today and the next MANIFEST_DAYS_AHEAD days (0 interval disables it)
+MANIFEST_INTERVAL_SECONDS = float(os.environ.get('MANIFEST_INTERVAL_SECONDS', '900'))
+MANIFEST_DAYS_AHEAD = int(os.environ.get('MANIFEST_DAYS_AHEAD', '1'))
+MANIFEST_BATCH_SIZE = int(os.environ.get('MANIFEST_BATCH_SIZE', '1000'))
+
+# One-off conversion of legacy ISO-string timestamps to BSON dates; runs in the background at startup,
+# checkpoints after every batch and resumes where it stopped
+MIGRATE_TIMESTAMPS_ON_STARTUP = os.environ.get('MIGRATE_TIMESTAMPS_ON_STARTUP', 'true').lower() in ('1', 'true', 'yes')
+MIGRATION_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', '500'))
+MIGRATION_BATCH_PAUSE_SECONDS = float(os.environ.get('MIGRATION_BATCH_PAUSE_SECONDS', '0.05'))
+
+# Hot/cold tiering: a background job moves delivered and cancelled orders older than ARCHIVE_AFTER_DAYS
+# into per-month orders_archive_YYYY_MM collections and keeps per-month rollups (0 interval disables it)
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '3600'))
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.environ.get('ARCHIVE_BATCH_PAUSE_SECONDS', '0.05'))
+# Archive months a list page reads concurrently before checking whether older months can still contribute
+ARCHIVE_PAGE_FANOUT = int(os.environ.get('ARCHIVE_PAGE_FANOUT', '4'))
+
+# Delta sync (`?since=` on list endpoints): the returned watermark trails the server clock by
+# SYNC_WATERMARK_LAG_SECONDS so writes in flight, on other workers or behind cache bus staleness are
+# re-sent rather than missed; deletions are kept as tombstones for SYNC_TOMBSTONE_TTL_SECONDS
+SYNC_WATERMARK_LAG_SECONDS = float(os.environ.get('SYNC_WATERMARK_LAG_SECONDS', '5'))
+SYNC_TOMBSTONE_TTL_SECONDS = int(os.environ.get('SYNC_TOMBSTONE_TTL_SECONDS', str(30 * 86400)))
+
+app = FastAPI(title="Gurukrupa Mess API", default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -87,8 +449,8 @@ class PlanCreate(BaseModel):
     is_active: bool = True
 
 class OrderCreate(BaseModel):
-    items: List[dict]  # [{name, qty, price}]
-    total: float
+    items: List[dict]  # [{name or id, qty}]; prices are looked up server-side
+    total: Optional[float] = None  # when sent, must match the server's total
     order_type: str = "single"  # single or subscription
     delivery_address: Optional[str] = ""
     notes: Optional[str] = ""
@@ -96,28 +458,1836 @@ class OrderCreate(BaseModel):
 class OrderStatusUpdate(BaseModel):
     status: str  # pending, preparing, out_for_delivery, delivered, cancelled
 
+class OrderBulkStatusUpdate(BaseModel):
+    order_ids: List[str]
+    status: str
+
 class SubscriptionCreate(BaseModel):
     plan_id: str
     start_date: Optional[str] = None
 
+# ============ TIMESTAMPS ============
+
+# Timestamps are stored as native BSON dates (UTC, millisecond precision) and only become
+# ISO 8601 strings when a response is serialized (orjson renders aware datetimes like isoformat()).
+
+def utc_now() -> datetime:
+    """Current UTC time truncated to what a BSON date keeps, so returned and stored values agree"""
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    """ISO 8601 text -> aware UTC datetime (naive input is taken as UTC); None if unparseable"""
+    try:
+        dt = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+    except (TypeError, ValueError, AttributeError):
+        return None
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+def day_of(field: str) -> dict:
+    """Aggregation expression for the UTC "YYYY-MM-DD" of a timestamp field, dates or not-yet-migrated text"""
+    return {"$cond": [
+        {"$eq": [{"$type": field}, "string"]},
+        {"$substrCP": [field, 0, 10]},
+        {"$dateToString": {"format": "%Y-%m-%d", "date": field}},
+    ]}
+
+# ============ CACHES ============
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+user_cache = TTLCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+
+def invalidate_user(user_id: str):
+    """Must be called after any write to a user document (profile, role, password)"""
+    user_cache.invalidate(user_id)
+    cache_bus.publish("user", user_id)
+
+WEEK_DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+def dump_json(obj) -> bytes:
+    """Serialize exactly like the default ORJSONResponse does"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_response(request: Request, body: bytes, etag: str) -> Response:
+    """Serve pre-serialized JSON, or a bare 304 when the client already holds this version"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def json_response(content, response: Optional[Response] = None) -> Response:
+    """Serialize Mongo documents straight to JSON, skipping FastAPI's jsonable_encoder walk.
+
+    For hot list endpoints whose documents hold only JSON types and datetimes; headers set on an
+    injected `response` (e.g. the pagination cursor) are carried over.
+    """
+    fast = Response(content=dump_json(content), media_type="application/json")
+    if response is not None:
+        fast.headers.update({k: v for k, v in response.headers.items() if k != "content-length"})
+    return fast
+
+class MenuSnapshot:
+    """Pre-serialized menu responses, rebuilt only after a menu write invalidates them"""
+
+    ALL = "__all__"
+    WEEKLY = "__weekly__"
+    DAILY_ONLY = "__daily__"
+
+    def __init__(self):
+        self.version = 0
+        self._built_version = -1
+        self._entries = {}
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.version += 1
+
+    async def get(self, key: str):
+        if not cache_bus.in_sync():
+            # Invalidations from other workers may have been missed; do not serve what we hold
+            self.invalidate()
+        if self._built_version != self.version:
+            async with self._lock:
+                if self._built_version != self.version:
+                    await self._rebuild()
+        return self._entries.get(key) or self._entries[self.DAILY_ONLY]
+
+    async def _rebuild(self):
+        version = self.version
+        items = await db.menu_items.find({"is_available": True}, {"_id": 0}).to_list(None)
+        days = set(WEEK_DAYS)
+        days.update(i.get("day_of_week") for i in items)
+        days.discard(None)
+        by_day = {d: [] for d in days}
+        by_day[self.DAILY_ONLY] = []
+        # One pass in storage order; "daily" items are merged into every day's list
+        for item in items:
+            dow = item.get("day_of_week")
+            if dow == "daily":
+                for bucket in by_day.values():
+                    bucket.append(item)
+            elif dow in by_day:
+                by_day[dow].append(item)
+        payloads = {key: dump_json(bucket) for key, bucket in by_day.items()}
+        payloads[self.ALL] = dump_json(items)
+        payloads[self.WEEKLY] = dump_json({d: by_day[d] for d in WEEK_DAYS})
+        self._entries = {key: (body, make_etag(body)) for key, body in payloads.items()}
+        # A write that landed mid-rebuild bumped the version, so the next read rebuilds again
+        self._built_version = version
+
+menu_snapshot = MenuSnapshot()
+
+def invalidate_menu(publish: bool = True):
+    """Must be called after any write to menu_items"""
+    menu_snapshot.invalidate()
+    price_table.invalidate()
+    if publish:
+        cache_bus.publish("menu")
+
+def invalidate_plans(publish: bool = True):
+    """Must be called after any write to subscription_plans"""
+    price_table.invalidate()
+    if publish:
+        cache_bus.publish("plans")
+
+# ============ WORKER COORDINATION ============
+
+# Identifies this process on the cache bus and as the holder of job leases
+PROCESS_ID = uuid.uuid4().hex
+
+class CacheBus:
+    """Keeps per-process caches coherent across workers through the capped `cache_events` collection.
+
+    Invalidations are applied locally straight away and appended to the collection; every process
+    tails it with a tailable await cursor and applies what the other processes published. Every event
+    read once caught up, and every poll that returns empty, marks the process in sync; if neither has
+    happened for CACHE_BUS_MAX_STALENESS_SECONDS,
+    in_sync() turns false and cached reads go to MongoDB instead, which bounds how stale any worker
+    can be. Local caches are flushed whenever the tail is (re)established, as events may have been
+    missed meanwhile.
+    """
+
+    def __init__(self):
+        self.last_sync = 0.0
+        self._handlers = {}
+        self._pending = set()
+        self._task = None
+
+    def on(self, scope: str, handler):
+        self._handlers[scope] = handler
+
+    def in_sync(self) -> bool:
+        return not CACHE_BUS_ENABLED or time.monotonic() - self.last_sync < CACHE_BUS_MAX_STALENESS_SECONDS
+
+    def stats(self) -> dict:
+        return {
+            "enabled": CACHE_BUS_ENABLED,
+            "in_sync": self.in_sync(),
+            "seconds_since_sync": round(time.monotonic() - self.last_sync, 3) if self.last_sync else None,
+        }
+
+    def publish(self, scope: str, data=None):
+        if not CACHE_BUS_ENABLED:
+            return
+        task = asyncio.create_task(self._insert(scope, data))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _insert(self, scope: str, data):
+        try:
+            await db.cache_events.insert_one({"origin": PROCESS_ID, "scope": scope, "data": data, "at": utc_now()})
+        except Exception as e:
+            logger.error(f"Cache bus publish of '{scope}' failed: {e}")
+
+    def start(self):
+        if CACHE_BUS_ENABLED:
+            self._task = asyncio.create_task(self._tail())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _connect(self):
+        try:
+            await db.create_collection("cache_events", capped=True, size=CACHE_BUS_CAPPED_BYTES)
+        except (CollectionInvalid, OperationFailure):
+            pass  # created by another worker
+        user_cache.clear()
+        menu_snapshot.invalidate()
+        price_table.invalidate()
+        forecast_cache.clear()
+        # Marker for where this connection starts; tailable cursors cannot start at "now" by themselves
+        result = await db.cache_events.insert_one({"origin": PROCESS_ID, "scope": "hello", "at": utc_now()})
+        return result.inserted_id
+
+    async def _tail(self):
+        while True:
+            try:
+                marker = await self._connect()
+                cursor = db.cache_events.find({}, cursor_type=CursorType.TAILABLE_AWAIT).max_await_time_ms(
+                    CACHE_BUS_POLL_MS
+                )
+                caught_up = False
+                while cursor.alive:
+                    async for event in cursor:
+                        if not caught_up:
+                            caught_up = event["_id"] == marker
+                        elif event.get("origin") != PROCESS_ID and event.get("scope") in self._handlers:
+                            self._handlers[event["scope"]](event.get("data"))
+                        # Under steady traffic getMores keep returning events and the loop below never runs
+                        if caught_up:
+                            self.last_sync = time.monotonic()
+                    if caught_up:
+                        self.last_sync = time.monotonic()
+                logger.warning("Cache bus cursor lost its position, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache bus tail failed, reconnecting: {e}")
+            self.last_sync = 0.0
+            await asyncio.sleep(1)
+
+cache_bus = CacheBus()
+cache_bus.on("user", lambda user_id: user_cache.invalidate(user_id))
+cache_bus.on("menu", lambda _: invalidate_menu(publish=False))
+cache_bus.on("plans", lambda _: invalidate_plans(publish=False))
+cache_bus.on("forecast", lambda _: forecast_cache.clear())
+cache_bus.on("order_feed", lambda event: order_feed.publish_remote(event["op"], event["data"]))
+
+async def acquire_lease(name: str, ttl: float) -> bool:
+    """True if this process holds, or has just taken over, the named lease for the next `ttl` seconds.
+
+    Keeps periodic jobs to one worker at a time; a lease whose holder died lapses after `ttl`.
+    """
+    now = utc_now()
+    try:
+        lease = await db.job_leases.find_one_and_update(
+            {"_id": name, "$or": [{"owner": PROCESS_ID}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"owner": PROCESS_ID, "expires_at": now + timedelta(seconds=ttl)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        return False
+    return lease is not None
+
+async def release_lease(name: str):
+    await db.job_leases.delete_one({"_id": name, "owner": PROCESS_ID})
+
+# ============ INDEXES ============
+
+# One entry per query pattern used by the handlers below (filter fields first, then sort)
+INDEX_SPECS = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("role", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="role_created_at_id"),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_id_created_at_id"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="status_created_at_id"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("user_id", ASCENDING), ("updated_at", ASCENDING)], name="user_id_updated_at"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "subscriptions": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_created_at"),
+        IndexModel([("status", ASCENDING), ("end_date", ASCENDING)], name="status_end_date"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("user_id", ASCENDING), ("updated_at", ASCENDING)], name="user_id_updated_at"),
+    ],
+    "delivery_manifests": [
+        IndexModel([("date", ASCENDING), ("subscription_id", ASCENDING)], name="date_subscription_unique", unique=True),
+        IndexModel([("date", ASCENDING), ("area", ASCENDING), ("user_name", ASCENDING)], name="date_area_user_name"),
+    ],
+    "menu_items": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("day_of_week", ASCENDING), ("is_available", ASCENDING)], name="day_of_week_is_available"),
+    ],
+    "subscription_plans": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("is_active", ASCENDING)], name="is_active"),
+    ],
+    "analytics_rollups": [
+        IndexModel([("granularity", ASCENDING), ("start", ASCENDING)], name="granularity_start"),
+    ],
+    "tombstones": [
+        IndexModel([("collection", ASCENDING), ("deleted_at", ASCENDING)], name="collection_deleted_at"),
+        IndexModel([("deleted_at", ASCENDING)], name="deleted_at_ttl", expireAfterSeconds=SYNC_TOMBSTONE_TTL_SECONDS),
+    ],
+    "archived_orders": [
+        IndexModel([("user_id", ASCENDING), ("month", DESCENDING)], name="user_id_month"),
+    ],
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS),
+    ],
+}
+
+async def ensure_indexes():
+    """Idempotently create INDEX_SPECS; a conflicting existing definition aborts startup"""
+    for collection, models in INDEX_SPECS.items():
+        try:
+            await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            logger.error(f"Index definition conflict on '{collection}': {e}")
+            raise
+    logger.info("Indexes ensured")
+
+# ============ PAGINATION ============
+
+# Keyset pagination over (created_at, id), newest first. The cursor for the next page is
+# returned in the X-Next-Cursor header so list bodies stay plain JSON arrays.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(doc: dict) -> str:
+    raw = dump_json([doc["created_at"], doc["id"]])
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, last_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    created_at = parse_timestamp(created_at)
+    if created_at is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, last_id
+
+def list_projection(fields: Optional[str], hidden=(), default=()) -> dict:
+    """Projection for `?fields=a,b,items.name`; id and created_at are always kept for the cursor.
+
+    With `default`, lists carry only those fields and `?fields=` asks for more on top of them.
+    """
+    if not fields and not default:
+        return {"_id": 0, **{f: 0 for f in hidden}}
+    projection = {"_id": 0, "id": 1, "created_at": 1, **{f: 1 for f in default}}
+    for field in (fields or "").split(","):
+        field = field.strip()
+        if field and field not in hidden and not field.startswith("$"):
+            projection[field] = 1
+    return projection
+
+PAGE_ORDER = [("created_at", -1), ("id", -1)]
+
+def after_cursor(query: dict, created_at: datetime, last_id: str) -> dict:
+    return {"$and": [query, {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": last_id}},
+    ]}]}
+
+async def paginate(collection, query: dict, projection: dict, limit: int, after: Optional[str], response: Response):
+    if after:
+        query = after_cursor(query, *decode_cursor(after))
+    docs = await collection.find(query, projection).sort(PAGE_ORDER).limit(limit + 1).to_list(limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1])
+    return docs
+
+# ============ DELTA SYNC ============
+
+# A list endpoint called with `?since=<watermark>` returns {"changed", "deleted", "watermark", "reset"}
+# instead of the full array: documents whose updated_at is after the watermark, ids that were deleted
+# or no longer belong in the list, and the watermark for the next call. Full responses carry a starting
+# watermark in the X-Sync-Watermark header. "reset" means the client must refetch the full list: the
+# watermark is older than the tombstones, or more than `limit` documents changed.
+SYNC_WATERMARK_HEADER = "X-Sync-Watermark"
+SYNC_LIST_LIMIT = 1000
+
+def sync_watermark() -> datetime:
+    return utc_now() - timedelta(seconds=SYNC_WATERMARK_LAG_SECONDS)
+
+def encode_watermark(watermark: datetime) -> str:
+    # "Z" rather than "+00:00": clients paste it into ?since= unencoded, where "+" would arrive as a space
+    return watermark.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def set_sync_watermark(response: Response, watermark: datetime):
+    response.headers[SYNC_WATERMARK_HEADER] = encode_watermark(watermark)
+
+def decode_since(since: str) -> datetime:
+    # Watermarks issued with a "+00:00" offset come back with the "+" decoded to a space
+    parsed = parse_timestamp(since.strip().replace(" ", "+"))
+    if parsed is None:
+        raise HTTPException(status_code=400, detail="Invalid since: expected a watermark from a previous response")
+    return parsed
+
+async def record_tombstone(collection: str, doc_id: str):
+    await db.tombstones.insert_one({"collection": collection, "id": doc_id, "deleted_at": utc_now()})
+
+async def delta_sync(collection, query: dict, since: str, limit: int, keep=None, projection=None,
+                     tombstones: bool = False) -> dict:
+    """Changes to `collection` matching `query` since the watermark; `keep(doc)` False reports a doc as deleted"""
+    since_at = decode_since(since)
+    watermark = sync_watermark()
+    if since_at < utc_now() - timedelta(seconds=SYNC_TOMBSTONE_TTL_SECONDS):
+        return {"changed": [], "deleted": [], "watermark": None, "reset": True}
+    changes = collection.find({**query, "updated_at": {"$gt": since_at}}, projection or {"_id": 0})
+    if tombstones:
+        docs, deleted = await asyncio.gather(
+            changes.limit(limit + 1).to_list(limit + 1),
+            db.tombstones.find({"collection": collection.name, "deleted_at": {"$gt": since_at}}, {"_id": 0, "id": 1}).to_list(None),
+        )
+        deleted = [t["id"] for t in deleted]
+    else:
+        docs, deleted = await changes.limit(limit + 1).to_list(limit + 1), []
+    if len(docs) > limit:
+        return {"changed": [], "deleted": [], "watermark": None, "reset": True}
+    changed = [doc for doc in docs if keep is None or keep(doc)]
+    deleted += [doc["id"] for doc in docs if keep is not None and not keep(doc)]
+    return {"changed": changed, "deleted": deleted, "watermark": encode_watermark(watermark), "reset": False}
+
+# ============ DASHBOARD STATS ============
+
+STATS_ID = "dashboard"
+
+def utc_today_start() -> datetime:
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def day_key(dt: datetime) -> str:
+    return dt.date().isoformat()
+
+async def compute_dashboard_stats(source) -> dict:
+    """Live statistics: one $facet pass over orders, run concurrently with the two other counts.
+
+    `source` is db, or read_db where replication lag is acceptable.
+    """
+    orders_pipeline = [{"$facet": {
+        "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+        "totals": [{"$group": {"_id": None, "count": {"$sum": 1}, "revenue": {"$sum": "$total"}}}],
+        "today": [{"$match": {"created_at": {"$gte": utc_today_start()}}}, {"$count": "count"}],
+    }}]
+    facet, total_customers, active_subs, rollups = await asyncio.gather(
+        source.orders.aggregate(orders_pipeline).to_list(1),
+        source.users.count_documents({"role": "customer"}),
+        source.subscriptions.count_documents({"status": "active"}),
+        source.order_rollups.find({}, {"orders_by_day": 0}).to_list(None),
+    )
+    facet = facet[0] if facet else {}
+    totals = facet.get("totals") or [{"count": 0, "revenue": 0}]
+    today = facet.get("today") or [{"count": 0}]
+    by_status = {row["_id"]: row["count"] for row in facet.get("by_status", []) if row["_id"]}
+    # Archived orders are counted from their monthly rollups
+    for rollup in rollups:
+        for status, count in rollup.get("orders_by_status", {}).items():
+            by_status[status] = by_status.get(status, 0) + count
+    return {
+        "orders_total": totals[0]["count"] + sum(r.get("orders_total", 0) for r in rollups),
+        "orders_by_status": by_status,
+        "revenue": totals[0]["revenue"] + sum(r.get("revenue", 0) for r in rollups),
+        "customers": total_customers,
+        "active_subscriptions": active_subs,
+        "today_orders": today[0]["count"],
+    }
+
+def dashboard_response(stats: dict) -> dict:
+    by_status = stats.get("orders_by_status", {})
+    return {
+        "total_orders": stats.get("orders_total", 0),
+        "pending_orders": by_status.get("pending", 0),
+        "preparing_orders": by_status.get("preparing", 0),
+        "delivered_orders": by_status.get("delivered", 0),
+        "total_customers": stats.get("customers", 0),
+        "active_subscriptions": stats.get("active_subscriptions", 0),
+        "total_revenue": stats.get("revenue", 0),
+        "today_orders": stats.get("today_orders", 0),
+    }
+
+async def bump_stats(inc: dict, batched: bool = False):
+    """Apply counter deltas to the materialized stats document; drift is repaired by reconcile_stats.
+
+    `batched` queues the update on stats_writes instead of awaiting its own round trip.
+    """
+    if not MATERIALIZED_STATS:
+        return
+    if batched:
+        stats_writes.submit([UpdateOne({"_id": STATS_ID}, {"$inc": inc}, upsert=True)])
+        return
+    try:
+        await db.stats.update_one({"_id": STATS_ID}, {"$inc": inc}, upsert=True)
+    except Exception as e:
+        logger.warning(f"Failed to update materialized stats {inc}: {e}")
+
+async def read_materialized_stats() -> dict:
+    today = day_key(datetime.now(timezone.utc))
+    projection = {field: 1 for field in ("orders_total", "orders_by_status", "revenue", "customers", "active_subscriptions")}
+    projection[f"orders_by_day.{today}"] = 1
+    doc = await read_db.stats.find_one({"_id": STATS_ID}, projection)
+    if doc is None:
+        return (await reconcile_stats())["stats"]
+    doc["today_orders"] = doc.pop("orders_by_day", {}).get(today, 0)
+    return doc
+
+async def reconcile_stats() -> dict:
+    """Recompute the stats document from the source collections, correct it and report any drift
+
+    The correction is applied as $inc of (actual - stored) per counter, so bump_stats deltas that land
+    while the aggregations run are kept rather than overwritten.
+    """
+    # Only the last STATS_DAYS_KEPT days are recomputed; older day counters are pruned below
+    since = utc_today_start() - timedelta(days=STATS_DAYS_KEPT - 1)
+    oldest = day_key(since)
+    live, by_day, rollups, stored = await asyncio.gather(
+        compute_dashboard_stats(db),
+        db.orders.aggregate([
+            {"$match": {"created_at": {"$gte": since}}},
+            {"$group": {"_id": day_of("$created_at"), "count": {"$sum": 1}}},
+        ]).to_list(None),
+        db.order_rollups.find({"newest_created_at": {"$gte": since}}, {"orders_by_day": 1}).to_list(None),
+        db.stats.find_one({"_id": STATS_ID}, {"_id": 0}),
+    )
+    fresh = {k: v for k, v in live.items() if k != "today_orders"}
+    fresh["orders_by_day"] = {row["_id"]: row["count"] for row in by_day if row["_id"]}
+    for rollup in rollups:
+        for day, count in rollup.get("orders_by_day", {}).items():
+            if day >= oldest:
+                fresh["orders_by_day"][day] = fresh["orders_by_day"].get(day, 0) + count
+    stored = stored or {}
+    expired = [day for day in stored.get("orders_by_day") or {} if day < oldest]
+    drift, inc = {}, {}
+    for field, actual in fresh.items():
+        if isinstance(actual, dict):
+            # Per-key counters (by status, by day); keys decremented to zero are not drift
+            stored_counts = {key: count for key, count in (stored.get(field) or {}).items() if key not in expired}
+            key_drift = {
+                key: {"stored": stored_counts.get(key, 0), "actual": actual.get(key, 0)}
+                for key in set(stored_counts) | set(actual)
+                if stored_counts.get(key, 0) != actual.get(key, 0)
+            }
+            for key, counts in key_drift.items():
+                inc[f"{field}.{key}"] = counts["actual"] - counts["stored"]
+            if key_drift:
+                drift[field] = key_drift
+        elif stored.get(field) != actual:
+            drift[field] = {"stored": stored.get(field), "actual": actual}
+            inc[field] = actual - (stored.get(field) or 0)
+    update = {"$set": {"reconciled_at": utc_now()}}
+    if inc:
+        update["$inc"] = inc
+    if expired:
+        update["$unset"] = {f"orders_by_day.{day}": "" for day in expired}
+    await db.stats.update_one({"_id": STATS_ID}, update, upsert=True)
+    if drift and stored:
+        logger.warning(f"Materialized stats drift repaired: {drift}")
+    return {"drift": drift, "stats": live}
+
+async def stats_reconcile_loop():
+    while True:
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL_SECONDS)
+        try:
+            if await acquire_lease("stats_reconcile", STATS_RECONCILE_INTERVAL_SECONDS * 2):
+                await reconcile_stats()
+        except Exception as e:
+            logger.error(f"Stats reconciliation failed: {e}")
+
+# ============ ORDER FEED ============
+
+ORDER_FEED_FIELDS = ("id", "user_name", "user_phone", "items", "total", "order_type", "status", "created_at")
+
+class OrderFeed:
+    """Shared ring buffer of order deltas with a single wake-up per published event.
+
+    Publishing appends once and swaps an asyncio.Event, so its cost does not depend on how many
+    admin devices are connected; each subscriber reads the buffer from its own position. Event ids
+    are "<epoch>-<seq>"; a client reconnecting with Last-Event-ID replays exactly what it missed,
+    or gets a "reset" event when the id belongs to another process or has left the buffer.
+    """
+
+    def __init__(self, maxlen: int):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.mode = "starting"
+        self.seq = 0
+        self._buffer = deque(maxlen=maxlen)
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def publish(self, op: str, data: dict):
+        self.seq += 1
+        self._buffer.append((self.seq, op, dump_json(data)))
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    def publish_local(self, op: str, data: dict):
+        """Called by the order handlers; only used when no change stream is feeding the buffer"""
+        if self.mode == "local":
+            self.publish(op, data)
+            # Other workers' admin connections hear about it through the cache bus
+            cache_bus.publish("order_feed", {"op": op, "data": data})
+
+    def publish_remote(self, op: str, data: dict):
+        if self.mode == "local":
+            self.publish(op, data)
+
+    def resolve(self, last_event_id: Optional[str]):
+        """Sequence number to resume after, and whether the client must refetch (gap)"""
+        if not last_event_id:
+            return self.seq, False
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.seq:
+            return self.seq, True
+        first = self._buffer[0][0] if self._buffer else self.seq + 1
+        if int(seq) < first - 1:
+            return self.seq, True
+        return int(seq), False
+
+    def since(self, seq: int):
+        if not self._buffer:
+            return []
+        return list(islice(self._buffer, max(0, seq - self._buffer[0][0] + 1), None))
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def start(self):
+        if ORDER_FEED_SOURCE == "local":
+            self.mode = "local"
+        else:
+            self._task = asyncio.create_task(self._watch())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _watch(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        resume_token = None
+        while True:
+            try:
+                async with db.orders.watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+                    self.mode = "change_stream"
+                    logger.info("Order feed attached to MongoDB change stream")
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        self._publish_change(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.mode != "change_stream" and ORDER_FEED_SOURCE == "auto":
+                    # e.g. standalone mongod without a replica set - fall back to in-process publishing
+                    logger.info(f"Change streams unavailable ({e}); order feed using in-process pub/sub")
+                    self.mode = "local"
+                    return
+                if isinstance(e, OperationFailure) and e.code == 286:
+                    # ChangeStreamHistoryLost: the oplog no longer holds our resume point
+                    resume_token = None
+                logger.warning(f"Order change stream interrupted, resuming: {e}")
+            await asyncio.sleep(1)
+
+    def _publish_change(self, change: dict):
+        doc = change.get("fullDocument") or {}
+        # An archived order moved back by a status change (see restore_archived_order) is not a new order
+        if change["operationType"] == "insert" and "restored_from" not in doc:
+            self.publish("insert", {k: doc.get(k) for k in ORDER_FEED_FIELDS})
+            return
+        updated = change.get("updateDescription", {}).get("updatedFields", {})
+        if "status" in updated or change["operationType"] != "update":
+            self.publish("status", {
+                "id": doc.get("id"),
+                "status": updated.get("status", doc.get("status")),
+                "updated_at": updated.get("updated_at", doc.get("updated_at")),
+            })
+
+order_feed = OrderFeed(ORDER_FEED_BUFFER)
+
+async def order_feed_stream(last_event_id: Optional[str]):
+    seq, gap = order_feed.resolve(last_event_id)
+    yield f"retry: 3000\nevent: hello\ndata: {dump_json({'mode': order_feed.mode}).decode('utf-8')}\n\n"
+    if gap:
+        yield f"id: {order_feed.epoch}-{seq}\nevent: reset\ndata: {{}}\n\n"
+    while True:
+        events = order_feed.since(seq)
+        for seq, op, payload in events:
+            yield f"id: {order_feed.epoch}-{seq}\nevent: {op}\ndata: {payload.decode('utf-8')}\n\n"
+        if not events and not await order_feed.wait(ORDER_FEED_KEEPALIVE_SECONDS):
+            yield ": keepalive\n\n"
+
+# ============ EXPORTS ============
+
+EXPORTS = {
+    "orders": {
+        "collection": "orders",
+        "archived": True,
+        "query": {},
+        "columns": ["id", "created_at", "updated_at", "user_id", "user_name", "user_phone", "order_type",
+                    "status", "payment_status", "total", "items", "delivery_address", "notes"],
+    },
+    "subscriptions": {
+        "collection": "subscriptions",
+        "query": {},
+        "columns": ["id", "created_at", "user_id", "user_name", "plan_id", "plan_name_en", "price",
+                    "start_date", "end_date", "status", "payment_status"],
+    },
+    "customers": {
+        "collection": "users",
+        "query": {"role": "customer"},
+        "columns": ["id", "created_at", "name", "email", "phone", "address", "language_pref"],
+    },
+}
+
+def parse_iso_utc(value: str, field: str) -> datetime:
+    dt = parse_timestamp(value)
+    if dt is None:
+        raise HTTPException(status_code=400, detail=f"Invalid {field}: expected an ISO date")
+    return dt
+
+def csv_cell(value):
+    if isinstance(value, list):
+        # Order items: "Lunch Tiffin x1; Chapati x2"
+        return "; ".join(f"{i.get('name', '')} x{i.get('qty', 1)}" if isinstance(i, dict) else str(i) for i in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+async def export_rows(cursor, columns: List[str], fmt: str):
+    """Yield encoded chunks, one per cursor batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(columns)
+    rows = 0
+    async for doc in cursor:
+        if fmt == "csv":
+            writer.writerow([csv_cell(doc.get(c)) for c in columns])
+        else:
+            buffer.write(dump_json({c: doc.get(c) for c in columns}).decode("utf-8"))
+            buffer.write("\n")
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+async def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+# ============ IDEMPOTENCY ============
+
+idempotency_cache = TTLCache(IDEMPOTENCY_CACHE_MAX_ENTRIES, IDEMPOTENCY_TTL_SECONDS)
+_idempotency_inflight = {}
+
+async def run_idempotent(scope: str, user_id: str, key: Optional[str], payload: dict, create):
+    """Execute `create()` at most once per (user, scope, Idempotency-Key) and replay its response.
+
+    Concurrent duplicates in this process await the same future; across processes a pending marker
+    with a unique _id in `idempotency_keys` (TTL-expired) guarantees a single execution.
+    """
+    if not key:
+        return await create()
+    doc_id = f"{user_id}:{scope}:{key}"
+    request_hash = hashlib.blake2b(dump_json(payload), digest_size=16).hexdigest()
+
+    cached = idempotency_cache.get(doc_id)
+    if cached is not None:
+        return check_idempotent_replay(cached, request_hash)
+    inflight = _idempotency_inflight.get(doc_id)
+    if inflight is not None:
+        return check_idempotent_replay(await asyncio.shield(inflight), request_hash)
+
+    future = asyncio.get_running_loop().create_future()
+    _idempotency_inflight[doc_id] = future
+    try:
+        stored = await claim_idempotency_key(doc_id, request_hash)
+        if stored is not None:
+            result = {"request_hash": stored["request_hash"], "response": stored["response"]}
+        else:
+            try:
+                response = await create()
+            except BaseException:
+                await db.idempotency_keys.delete_one({"_id": doc_id, "status": "pending"})
+                raise
+            await complete_idempotency_key(doc_id, response)
+            result = {"request_hash": request_hash, "response": response}
+        idempotency_cache.set(doc_id, result)
+        future.set_result(result)
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        _idempotency_inflight.pop(doc_id, None)
+    return check_idempotent_replay(result, request_hash)
+
+async def complete_idempotency_key(doc_id: str, response):
+    """Mark the key done with its response, retrying on failure.
+
+    create() has already run, so failing the request now would have the client retry it, and once
+    the pending marker is older than IDEMPOTENCY_PENDING_TIMEOUT_SECONDS that retry would take it
+    over and run create() again. If every attempt fails the response is still returned (and replayed
+    by this process from idempotency_cache); the error is logged.
+    """
+    done = {"$set": {"status": "done", "response": response}}
+    for delay in (*IDEMPOTENCY_COMPLETE_RETRY_DELAYS, None):
+        try:
+            if ORDER_INSERT_BATCHING:
+                await idempotency_writes.write(UpdateOne({"_id": doc_id}, done))
+            else:
+                await db.idempotency_keys.update_one({"_id": doc_id}, done)
+            return
+        except Exception as e:
+            if delay is None:
+                logger.error(f"Could not record the response for Idempotency-Key {doc_id}: {e}")
+                return
+            logger.warning(f"Recording the response for Idempotency-Key {doc_id} failed, retrying: {e}")
+            await asyncio.sleep(delay)
+
+def check_idempotent_replay(result: dict, request_hash: str):
+    if result["request_hash"] != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    return result["response"]
+
+async def claim_idempotency_key(doc_id: str, request_hash: str):
+    """Insert the pending marker; returns the stored record when the key was already completed"""
+    now = datetime.now(timezone.utc)
+    marker = {"_id": doc_id, "status": "pending", "request_hash": request_hash, "created_at": now}
+    try:
+        if ORDER_INSERT_BATCHING:
+            await idempotency_writes.insert(marker)
+        else:
+            await db.idempotency_keys.insert_one(marker)
+        return None
+    except DuplicateKeyError:
+        pass
+    existing = await db.idempotency_keys.find_one({"_id": doc_id})
+    if existing and existing.get("status") == "done":
+        return existing
+    # Take over markers left behind by a request that died mid-flight
+    stale = now - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT_SECONDS)
+    taken = await db.idempotency_keys.find_one_and_update(
+        {"_id": doc_id, "status": "pending", "created_at": {"$lt": stale}},
+        {"$set": {"request_hash": request_hash, "created_at": now}},
+    )
+    if taken is None:
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still in progress",
+            headers={"Retry-After": "1"},
+        )
+    return None
+
+# ============ WRITE BATCHING ============
+
+class WriteBatcher:
+    """Coalesces concurrent single-document writes to one collection into unordered bulk_write calls.
+
+    The first write of a batch starts a linger timer; the batch is flushed when the timer fires or
+    when it reaches max_batch, whichever comes first. Callers of write()/insert() await their own
+    operation's outcome: a per-operation error (e.g. a duplicate key) is raised only to that caller,
+    while a failure of the whole command or of its write concern is raised to everyone in the batch.
+    submit() queues best-effort writes (counters) that nobody awaits; their failures are logged.
+    """
+
+    def __init__(self, collection: str, max_batch: int, linger_ms: float):
+        self.collection = collection
+        self.max_batch = max(1, max_batch)
+        self.linger = linger_ms / 1000
+        self._pending = []
+        self._timer = None
+        self._flushes = set()
+
+    async def write(self, op):
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(op, future)
+        # A caller cancelled while waiting does not withdraw its operation, just as with a write in flight
+        await future
+
+    async def insert(self, doc: dict):
+        await self.write(InsertOne(doc))
+
+    def submit(self, ops: list):
+        for op in ops:
+            self._enqueue(op, None)
+
+    def _enqueue(self, op, future):
+        self._pending.append((op, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.linger, self._flush)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: list):
+        metrics.observe("write_batch_size", (("collection", self.collection),), len(batch))
+        failed = {}
+        try:
+            await db[self.collection].bulk_write([op for op, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                error_type = DuplicateKeyError if error.get("code") == 11000 else WriteError
+                failed[error["index"]] = error_type(error.get("errmsg", "Write error"), error.get("code"), error)
+            # The other writes were applied but may not be durable, so nobody in the batch is told they succeeded
+            concern_errors = e.details.get("writeConcernErrors") or []
+            if concern_errors:
+                error = concern_errors[0]
+                concern_error = WriteConcernError(error.get("errmsg", "Write concern error"), error.get("code"), error)
+                failed = {i: failed.get(i, concern_error) for i in range(len(batch))}
+        except Exception as e:
+            failed = {i: e for i in range(len(batch))}
+        unawaited = [failed[i] for i, (_, future) in enumerate(batch) if future is None and i in failed]
+        if unawaited:
+            logger.warning(f"{len(unawaited)} batched writes to {self.collection} failed: {unawaited[0]}")
+        for i, (_, future) in enumerate(batch):
+            if future is None or future.done():
+                continue
+            if i in failed:
+                future.set_exception(failed[i])
+            else:
+                future.set_result(None)
+
+    async def drain(self):
+        """Flush anything pending and wait for in-flight writes (shutdown)"""
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+order_writes = WriteBatcher("orders", ORDER_INSERT_MAX_BATCH, ORDER_INSERT_LINGER_MS)
+stats_writes = WriteBatcher("stats", ORDER_INSERT_MAX_BATCH, ORDER_INSERT_LINGER_MS)
+analytics_writes = WriteBatcher("analytics_rollups", ORDER_INSERT_MAX_BATCH, ORDER_INSERT_LINGER_MS)
+idempotency_writes = WriteBatcher("idempotency_keys", ORDER_INSERT_MAX_BATCH, ORDER_INSERT_LINGER_MS)
+WRITE_BATCHERS = (order_writes, stats_writes, analytics_writes, idempotency_writes)
+
+# ============ PRICING ============
+
+# Default prices of meals sold as such rather than as menu dishes. Priced menu items (extras) and
+# active plans are added when the table is built and override these by name, so a meal can be
+# repriced by adding a menu item with its name. Dishes priced 0 come with a meal and cannot be
+# ordered alone.
+MEAL_PRICES = {"Lunch Tiffin": 80, "Dinner Tiffin": 90, "Dine-In Unlimited Thali": 80}
+MAX_ORDER_ITEM_QTY = 50
+
+class PriceTable:
+    """Authoritative unit prices, rebuilt from menu_items and subscription_plans only after a write invalidates them.
+
+    Keyed by menu item / plan id and by lowercased English and Marathi name, so pricing an order is
+    a few dict lookups with no database access.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._built_version = -1
+        self._prices = {}
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.version += 1
+
+    async def get(self) -> dict:
+        if not cache_bus.in_sync():
+            self.invalidate()
+        if self._built_version != self.version:
+            async with self._lock:
+                if self._built_version != self.version:
+                    await self._rebuild()
+        return self._prices
+
+    async def _rebuild(self):
+        version = self.version
+        fields = {"_id": 0, "id": 1, "name_en": 1, "name_mr": 1, "price": 1}
+        menu, plans = await asyncio.gather(
+            db.menu_items.find({"is_available": True, "price": {"$gt": 0}}, fields).to_list(None),
+            db.subscription_plans.find({"is_active": True}, fields).to_list(None),
+        )
+        stored = {}
+        for entry in menu + plans:
+            line = (entry.get("name_en") or entry["id"], entry["price"])
+            stored[entry["id"]] = line
+            for name in (entry.get("name_en"), entry.get("name_mr")):
+                if name:
+                    stored.setdefault(name.strip().lower(), line)
+        self._prices = {**{name.lower(): (name, price) for name, price in MEAL_PRICES.items()}, **stored}
+        self._built_version = version
+
+price_table = PriceTable()
+
+def price_order(items: List[dict], prices: dict):
+    """Order lines at server prices and their total; unknown items or bad quantities are a 400"""
+    if not items:
+        raise HTTPException(status_code=400, detail="Order has no items")
+    lines = []
+    total = 0
+    for item in items:
+        if not isinstance(item, dict):
+            raise HTTPException(status_code=400, detail="Invalid order item")
+        ref = str(item.get("id") or item.get("name") or "")
+        entry = prices.get(ref) or prices.get(ref.strip().lower())
+        if entry is None:
+            raise HTTPException(status_code=400, detail=f"Unknown item: {ref}")
+        qty = item.get("qty", 1)
+        if isinstance(qty, bool) or not isinstance(qty, int) or not 1 <= qty <= MAX_ORDER_ITEM_QTY:
+            raise HTTPException(status_code=400, detail=f"Quantity for {entry[0]} must be 1-{MAX_ORDER_ITEM_QTY}")
+        name, price = entry
+        lines.append({"name": name, "qty": qty, "price": price})
+        total += price * qty
+    return lines, round(total, 2)
+
+# ============ KITCHEN FORECAST ============
+
+# Order line items whose name contains one of these are whole meals (one portion of every dish on
+# that day's menu); anything else, e.g. "Extra Chapati", is forecast on its own
+MEAL_ITEM_KEYWORDS = ("tiffin", "thali")
+
+forecast_cache = TTLCache(64, FORECAST_CACHE_TTL_SECONDS)
+
+def invalidate_forecast():
+    forecast_cache.clear()
+    cache_bus.publish("forecast")
+
+async def compute_forecast(days: int, lookback_days: int) -> dict:
+    """Per-dish portions for the next `days` days.
+
+    Demand per day = subscription meals covering that day + the average walk-in meals seen on the same
+    weekday over the last `lookback_days` complete days. The three inputs are fetched concurrently as
+    small pre-grouped aggregations and joined with NumPy/pandas in one vectorized pass.
+    """
+    today = utc_today_start()
+    horizon = np.arange(np.datetime64(today.date(), "D"), np.datetime64(today.date(), "D") + days)
+    lookback_start = today - timedelta(days=lookback_days)
+
+    subs_pipeline = [
+        {"$match": {"status": "active", "end_date": {"$gt": today}}},
+        {"$group": {
+            "_id": {
+                "plan_id": "$plan_id",
+                "start": day_of("$start_date"),
+                "end": day_of("$end_date"),
+            },
+            "count": {"$sum": 1},
+        }},
+    ]
+    history_pipeline = [
+        {"$match": {
+            "created_at": {"$gte": lookback_start, "$lt": today},
+            "status": {"$ne": "cancelled"},
+            "order_type": {"$ne": "subscription"},
+        }},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {"day": day_of("$created_at"), "name": "$items.name"},
+            "qty": {"$sum": "$items.qty"},
+        }},
+    ]
+    # Lookbacks past ARCHIVE_AFTER_DAYS reach into the monthly archives; the pivot below sums rows
+    # for the same day and item coming from different collections
+    history_sources = await order_sources(db, lookback_start, today)
+    sub_groups, history, menu, plans = await asyncio.gather(
+        db.subscriptions.aggregate(subs_pipeline).to_list(None),
+        asyncio.gather(*(source.aggregate(history_pipeline).to_list(None) for source in history_sources)),
+        db.menu_items.find(
+            {"is_available": True},
+            {"_id": 0, "id": 1, "name_en": 1, "name_mr": 1, "category": 1, "day_of_week": 1},
+        ).to_list(None),
+        db.subscription_plans.find({}, {"_id": 0, "id": 1, "meals_per_day": 1}).to_list(None),
+    )
+
+    history = [row for rows in history for row in rows]
+
+    # Subscription meals: (days x groups) coverage matrix times meals per group
+    meals_per_plan = {p["id"]: p.get("meals_per_day", 1) for p in plans}
+    if sub_groups:
+        starts = np.array([g["_id"]["start"] for g in sub_groups], dtype="datetime64[D]")
+        ends = np.array([g["_id"]["end"] for g in sub_groups], dtype="datetime64[D]")
+        weights = np.array([g["count"] * meals_per_plan.get(g["_id"]["plan_id"], 1) for g in sub_groups])
+        covered = (starts[None, :] <= horizon[:, None]) & (horizon[:, None] < ends[None, :])
+        subscription_meals = covered.astype(np.int64) @ weights
+    else:
+        subscription_meals = np.zeros(days, dtype=np.int64)
+
+    # Walk-in demand: mean quantity per weekday (0 = Monday) for every item name
+    weekday_counts = np.bincount(
+        pd.date_range(lookback_start.date(), periods=lookback_days, freq="D").dayofweek, minlength=7
+    )
+    per_weekday = pd.DataFrame(0.0, index=pd.Index([], name="name"), columns=range(7))
+    if history:
+        frame = pd.DataFrame(
+            {"day": [h["_id"]["day"] for h in history], "name": [h["_id"].get("name") for h in history],
+             "qty": [h["qty"] for h in history]}
+        ).dropna()
+        frame["weekday"] = pd.to_datetime(frame["day"]).dt.dayofweek
+        per_weekday = frame.pivot_table(index="name", columns="weekday", values="qty", aggfunc="sum", fill_value=0)
+        per_weekday = per_weekday.reindex(columns=range(7), fill_value=0) / np.maximum(weekday_counts, 1)
+    is_meal = per_weekday.index.str.lower().str.contains("|".join(MEAL_ITEM_KEYWORDS)) if len(per_weekday) else []
+    walk_in_meals = per_weekday[is_meal].sum(axis=0).to_numpy() if len(per_weekday) else np.zeros(7)
+    extras = per_weekday[~is_meal] if len(per_weekday) else per_weekday
+
+    horizon_weekdays = pd.DatetimeIndex(horizon).dayofweek.to_numpy()
+    expected_walk_in = walk_in_meals[horizon_weekdays]
+    total_meals = np.ceil(subscription_meals + expected_walk_in).astype(np.int64)
+
+    forecast = []
+    for i, date in enumerate(horizon):
+        weekday = WEEK_DAYS[horizon_weekdays[i]]
+        dishes = [m for m in menu if m.get("day_of_week") in (weekday, "daily")]
+        extra_qty = np.ceil(extras[horizon_weekdays[i]].to_numpy()) if len(extras) else []
+        forecast.append({
+            "date": str(date),
+            "day_of_week": weekday,
+            "subscription_meals": int(subscription_meals[i]),
+            "expected_walk_in_meals": round(float(expected_walk_in[i]), 1),
+            "total_meals": int(total_meals[i]),
+            "dishes": [{**dish, "portions": int(total_meals[i])} for dish in dishes],
+            "extras": [
+                {"name": name, "qty": int(qty)} for name, qty in zip(extras.index, extra_qty) if qty > 0
+            ],
+        })
+    return {
+        "generated_at": utc_now(),
+        "days": days,
+        "lookback_days": lookback_days,
+        "forecast": forecast,
+    }
+
+# ============ DELIVERY MANIFESTS ============
+
+def delivery_area(address: str) -> str:
+    """Locality of an address: "Flat 301, Sunrise Apartments, Kothrud, Pune" is delivered to Kothrud"""
+    parts = [p.strip() for p in (address or "").split(",") if p.strip()]
+    if len(parts) >= 2:
+        return parts[-2]
+    return parts[0] if parts else "Unassigned"
+
+async def expire_subscriptions() -> int:
+    """Flip every active subscription past its end_date to expired in one update_many"""
+    now = utc_now()
+    result = await db.subscriptions.update_many(
+        {"status": "active", "end_date": {"$lte": now}},
+        {"$set": {"status": "expired", "updated_at": now}},
+    )
+    if result.modified_count:
+        await bump_stats({"active_subscriptions": -result.modified_count})
+        invalidate_forecast()
+        logger.info(f"Expired {result.modified_count} subscriptions")
+    return result.modified_count
+
+async def build_delivery_manifest(day: datetime) -> dict:
+    """Upsert one manifest row per active subscription delivering on `day` and drop rows that no longer apply.
+
+    Subscriptions deliver on every day in [start day, end day), the same rule the kitchen forecast uses.
+    Dates are compared inside the query and the matching subscriptions are streamed off a cursor in
+    MANIFEST_BATCH_SIZE batches.
+    """
+    date = day_key(day)
+    next_day = day.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    run_id = str(uuid.uuid4())
+    generated_at = utc_now()
+    meals_per_plan = {
+        p["id"]: p.get("meals_per_day", 1)
+        for p in await db.subscription_plans.find({}, {"_id": 0, "id": 1, "meals_per_day": 1}).to_list(None)
+    }
+    cursor = db.subscriptions.find(
+        {"status": "active", "end_date": {"$gte": next_day}, "start_date": {"$lt": next_day}},
+        {"_id": 0, "id": 1, "user_id": 1, "user_name": 1, "plan_id": 1, "plan_name_en": 1, "plan_name_mr": 1},
+        batch_size=MANIFEST_BATCH_SIZE,
+    )
+
+    deliveries = 0
+    batch = []
+
+    async def flush():
+        user_ids = list({sub["user_id"] for sub in batch})
+        users = {
+            u["id"]: u for u in await db.users.find(
+                {"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "phone": 1, "address": 1}
+            ).to_list(None)
+        }
+        ops = []
+        for sub in batch:
+            user = users.get(sub["user_id"], {})
+            address = user.get("address", "")
+            ops.append(UpdateOne(
+                {"date": date, "subscription_id": sub["id"]},
+                {
+                    "$set": {
+                        "area": delivery_area(address),
+                        "address": address,
+                        "phone": user.get("phone", ""),
+                        "user_id": sub["user_id"],
+                        "user_name": sub.get("user_name", ""),
+                        "plan_id": sub.get("plan_id"),
+                        "plan_name_en": sub.get("plan_name_en", ""),
+                        "plan_name_mr": sub.get("plan_name_mr", ""),
+                        "meals": meals_per_plan.get(sub.get("plan_id"), 1),
+                        "run_id": run_id,
+                        "generated_at": generated_at,
+                    },
+                    "$setOnInsert": {"id": str(uuid.uuid4()), "status": "scheduled"},
+                },
+                upsert=True,
+            ))
+        await db.delivery_manifests.bulk_write(ops, ordered=False)
+        batch.clear()
+
+    async for sub in cursor:
+        batch.append(sub)
+        deliveries += 1
+        if len(batch) >= MANIFEST_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+
+    # Rows this run did not touch belong to subscriptions that were cancelled or expired since the last run
+    removed = await db.delivery_manifests.delete_many({"date": date, "run_id": {"$ne": run_id}})
+    return {"date": date, "deliveries": deliveries, "removed": removed.deleted_count, "generated_at": generated_at}
+
+# Held only while a build runs, by the loop and by manual builds alike: concurrent runs would delete
+# each other's rows (see build_delivery_manifest). The loop's own lease just picks the scheduling worker.
+MANIFEST_RUN_LEASE_SECONDS = 600
+_manifest_run_lock = asyncio.Lock()
+
+async def run_manifest_job() -> Optional[dict]:
+    """Expire subscriptions and rebuild manifests; None when a build is already running somewhere"""
+    if _manifest_run_lock.locked():
+        return None
+    async with _manifest_run_lock:
+        if not await acquire_lease("delivery_manifests_run", MANIFEST_RUN_LEASE_SECONDS):
+            return None
+        try:
+            expired = await expire_subscriptions()
+            today = utc_today_start()
+            manifests = [await build_delivery_manifest(today + timedelta(days=i)) for i in range(MANIFEST_DAYS_AHEAD + 1)]
+        finally:
+            await release_lease("delivery_manifests_run")
+    return {"expired": expired, "manifests": manifests}
+
+async def manifest_loop():
+    while True:
+        try:
+            if await acquire_lease("delivery_manifests", MANIFEST_INTERVAL_SECONDS * 2):
+                await run_manifest_job()
+        except Exception as e:
+            logger.error(f"Delivery manifest job failed: {e}")
+        await asyncio.sleep(MANIFEST_INTERVAL_SECONDS)
+
+# ============ TIMESTAMP MIGRATION ============
+
+TIMESTAMP_FIELDS = {
+    "users": ("created_at",),
+    "orders": ("created_at", "updated_at"),
+    "subscriptions": ("created_at", "updated_at", "start_date", "end_date"),
+    "menu_items": ("created_at",),
+    "subscription_plans": ("created_at",),
+}
+MIGRATION_ID = "native_dates"
+
+async def migrate_timestamps() -> dict:
+    """Convert ISO-string timestamps in TIMESTAMP_FIELDS to BSON dates, in _id order and in batches.
+
+    Safe to run while serving traffic and from several processes at once: every update is conditional
+    on the field still holding the string that was read, so a concurrent write always wins. Progress is
+    checkpointed in `migrations` after each batch, so a restarted run resumes from the last _id.
+    """
+    state = await db.migrations.find_one({"_id": MIGRATION_ID}) or {}
+    if state.get("done"):
+        return state
+    for collection, fields in TIMESTAMP_FIELDS.items():
+        progress = (state.get("collections") or {}).get(collection) or {}
+        if progress.get("done"):
+            continue
+        last_id = progress.get("last_id")
+        converted, unparseable = progress.get("converted", 0), progress.get("unparseable", 0)
+        legacy = {"$or": [{field: {"$type": "string"}} for field in fields]}
+        while True:
+            query = legacy if last_id is None else {**legacy, "_id": {"$gt": last_id}}
+            docs = await db[collection].find(query, {field: 1 for field in fields}).sort(
+                "_id", ASCENDING
+            ).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+            if not docs:
+                break
+            ops = []
+            for doc in docs:
+                for field in fields:
+                    value = doc.get(field)
+                    if not isinstance(value, str):
+                        continue
+                    parsed = parse_timestamp(value)
+                    if parsed is None:
+                        unparseable += 1
+                        continue
+                    ops.append(UpdateOne({"_id": doc["_id"], field: value}, {"$set": {field: parsed}}))
+            if ops:
+                result = await db[collection].bulk_write(ops, ordered=False)
+                converted += result.modified_count
+            last_id = docs[-1]["_id"]
+            await db.migrations.update_one(
+                {"_id": MIGRATION_ID},
+                {"$set": {f"collections.{collection}": {
+                    "last_id": last_id, "converted": converted, "unparseable": unparseable,
+                }}},
+                upsert=True,
+            )
+            await asyncio.sleep(MIGRATION_BATCH_PAUSE_SECONDS)
+        await db.migrations.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {f"collections.{collection}": {
+                "done": True, "converted": converted, "unparseable": unparseable,
+            }}},
+            upsert=True,
+        )
+        logger.info(f"Timestamp migration: {collection} done, {converted} fields converted, {unparseable} unparseable")
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID}, {"$set": {"done": True, "completed_at": utc_now()}}, upsert=True
+    )
+    # Cached aggregates may have been computed while part of the data was still text
+    invalidate_forecast()
+    return await db.migrations.find_one({"_id": MIGRATION_ID})
+
+async def run_timestamp_migration():
+    try:
+        await migrate_timestamps()
+    except Exception as e:
+        logger.error(f"Timestamp migration stopped, will resume on next start: {e}")
+
+# ============ ORDER ARCHIVE ============
+
+# Settled orders past ARCHIVE_AFTER_DAYS live in orders_archive_YYYY_MM (by created_at month). Each
+# month has a document in order_rollups with its totals, which the dashboard adds to the live counts;
+# a rollup marked `stale` is being changed by an archive batch and is recomputed before the next one.
+# archived_orders maps each archived order id to its month and user, so a lookup by id reads one archive
+# at most and a customer's order list only reads the months that hold their orders.
+ARCHIVE_STATUSES = ("delivered", "cancelled")
+ARCHIVE_PREFIX = "orders_archive_"
+ARCHIVE_INDEX_NAMES = ("id_unique", "user_id_created_at_id", "status_created_at_id", "created_at_id")
+
+# v2 adds user_id to the entries written by the first version
+ARCHIVE_INDEX_MIGRATION_ID = "archived_orders_index_v2"
+
+_indexed_archives = set()
+_archive_index_ready = False
+
+def archive_collection(month: str):
+    return db[ARCHIVE_PREFIX + month]
+
+async def ensure_archive_indexes(month: str):
+    if month not in _indexed_archives:
+        await archive_collection(month).create_indexes(
+            [index for index in INDEX_SPECS["orders"] if index.document["name"] in ARCHIVE_INDEX_NAMES]
+        )
+        _indexed_archives.add(month)
+
+def archivable(cutoff: datetime) -> dict:
+    # Orders touched since the cutoff (e.g. a late cancellation) stay hot
+    return {
+        "status": {"$in": list(ARCHIVE_STATUSES)},
+        "created_at": {"$lt": cutoff},
+        "updated_at": {"$not": {"$gte": cutoff}},
+    }
+
+async def refresh_rollup(month: str):
+    """Recompute a month's rollup from its archive collection; idempotent"""
+    facet = await archive_collection(month).aggregate([{"$facet": {
+        "totals": [{"$group": {
+            "_id": None, "count": {"$sum": 1}, "revenue": {"$sum": "$total"}, "newest": {"$max": "$created_at"},
+        }}],
+        "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+        "by_day": [{"$group": {"_id": day_of("$created_at"), "count": {"$sum": 1}}}],
+    }}]).to_list(1)
+    facet = facet[0] if facet else {}
+    totals = facet.get("totals") or [{"count": 0, "revenue": 0, "newest": None}]
+    await db.order_rollups.update_one({"_id": month}, {"$set": {
+        "orders_total": totals[0]["count"],
+        "revenue": totals[0]["revenue"],
+        "newest_created_at": totals[0]["newest"],
+        "orders_by_status": {row["_id"]: row["count"] for row in facet.get("by_status", []) if row["_id"]},
+        "orders_by_day": {row["_id"]: row["count"] for row in facet.get("by_day", []) if row["_id"]},
+        "stale": False,
+        "refreshed_at": utc_now(),
+    }}, upsert=True)
+
+async def archive_batch(cutoff: datetime) -> int:
+    """Move one batch of archivable orders; returns how many left the hot collection"""
+    docs = await db.orders.find(archivable(cutoff)).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+    if not docs:
+        return 0
+    by_month = {}
+    for doc in docs:
+        by_month.setdefault(doc["created_at"].strftime("%Y_%m"), []).append(doc)
+    # Copy first, then delete: a crash in between leaves duplicates that the next run's upserts absorb
+    for month, batch in by_month.items():
+        await ensure_archive_indexes(month)
+        await archive_collection(month).bulk_write(
+            [ReplaceOne({"id": doc["id"]}, doc, upsert=True) for doc in batch], ordered=False
+        )
+    await db.archived_orders.bulk_write(
+        [ReplaceOne({"_id": doc["id"]}, {"month": month, "user_id": doc.get("user_id")}, upsert=True)
+         for month, batch in by_month.items() for doc in batch],
+        ordered=False,
+    )
+    await db.order_rollups.bulk_write(
+        [UpdateOne({"_id": month}, {"$set": {"stale": True}}, upsert=True) for month in by_month], ordered=False
+    )
+    ids = [doc["id"] for doc in docs]
+    result = await db.orders.delete_many({**archivable(cutoff), "id": {"$in": ids}})
+    if result.deleted_count < len(ids):
+        # Changed after it was read: the hot copy stays authoritative, so drop the archived one
+        kept = {doc["id"] async for doc in db.orders.find({"id": {"$in": ids}}, {"_id": 0, "id": 1})}
+        for month, batch in by_month.items():
+            stale_ids = [doc["id"] for doc in batch if doc["id"] in kept]
+            if stale_ids:
+                await archive_collection(month).delete_many({"id": {"$in": stale_ids}})
+                await db.archived_orders.delete_many({"_id": {"$in": stale_ids}})
+    for month in by_month:
+        await refresh_rollup(month)
+    return result.deleted_count
+
+async def index_archived_orders():
+    """Fill archived_orders from the archive collections, for orders archived before it existed"""
+    global _archive_index_ready
+    if await archive_index_ready():
+        return
+    for rollup in await archived_months():
+        month = rollup["_id"]
+        docs = await archive_collection(month).find({}, {"_id": 0, "id": 1, "user_id": 1}).to_list(None)
+        for start in range(0, len(docs), ARCHIVE_BATCH_SIZE):
+            await db.archived_orders.bulk_write([
+                ReplaceOne({"_id": doc["id"]}, {"month": month, "user_id": doc.get("user_id")}, upsert=True)
+                for doc in docs[start:start + ARCHIVE_BATCH_SIZE]
+            ], ordered=False)
+    await db.migrations.update_one(
+        {"_id": ARCHIVE_INDEX_MIGRATION_ID}, {"$set": {"done": True, "completed_at": utc_now()}}, upsert=True
+    )
+    _archive_index_ready = True
+
+async def archive_index_ready() -> bool:
+    """Whether every archived order has its archived_orders entry; cached once it is true"""
+    global _archive_index_ready
+    if not _archive_index_ready:
+        state = await db.migrations.find_one({"_id": ARCHIVE_INDEX_MIGRATION_ID}) or {}
+        _archive_index_ready = bool(state.get("done"))
+    return _archive_index_ready
+
+async def run_archive_job() -> dict:
+    cutoff = utc_now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    await index_archived_orders()
+    # Months left stale by an interrupted run
+    async for rollup in db.order_rollups.find({"stale": True}, {"_id": 1}):
+        await refresh_rollup(rollup["_id"])
+    archived = 0
+    while True:
+        moved = await archive_batch(cutoff)
+        if not moved:
+            break
+        archived += moved
+        await asyncio.sleep(ARCHIVE_BATCH_PAUSE_SECONDS)
+    if archived:
+        logger.info(f"Archived {archived} orders created before {cutoff.isoformat()}")
+    return {"archived": archived, "cutoff": cutoff}
+
+async def archive_loop():
+    while True:
+        try:
+            if await acquire_lease("orders_archive", ARCHIVE_INTERVAL_SECONDS * 2):
+                await run_archive_job()
+        except Exception as e:
+            logger.error(f"Order archive job failed: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+async def archived_months() -> List[dict]:
+    """Rollup documents (month and newest created_at), newest month first"""
+    return await db.order_rollups.find({}, {"_id": 1, "newest_created_at": 1}).sort("_id", -1).to_list(None)
+
+async def archived_order_month(order_id: str) -> Optional[str]:
+    entry = await db.archived_orders.find_one({"_id": order_id})
+    return entry["month"] if entry else None
+
+async def find_archived_order(order_id: str) -> Optional[dict]:
+    month = await archived_order_month(order_id)
+    if month is None:
+        return None
+    return await archive_collection(month).find_one({"id": order_id}, {"_id": 0})
+
+async def order_sources(source, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> list:
+    """`source`.orders plus the archive collections whose month overlaps created_at range [date_from, date_to)"""
+    first = date_from.astimezone(timezone.utc).strftime("%Y_%m") if date_from else None
+    last = (date_to - timedelta(microseconds=1)).astimezone(timezone.utc).strftime("%Y_%m") if date_to else None
+    return [source.orders] + [
+        source[ARCHIVE_PREFIX + m["_id"]] for m in await archived_months()
+        if (first is None or m["_id"] >= first) and (last is None or m["_id"] <= last)
+    ]
+
+async def merge_by_created_at(cursors):
+    """Yield the documents of cursors each sorted by created_at ascending as one ascending stream"""
+    iterators = [cursor.__aiter__() for cursor in cursors]
+    heap = []
+    async def advance(index: int):
+        try:
+            doc = await iterators[index].__anext__()
+        except StopAsyncIteration:
+            return
+        created_at = doc.get("created_at")
+        key = created_at if isinstance(created_at, datetime) else datetime.min.replace(tzinfo=timezone.utc)
+        heapq.heappush(heap, (key, index, doc))
+    for index in range(len(iterators)):
+        await advance(index)
+    while heap:
+        _, index, doc = heapq.heappop(heap)
+        yield doc
+        await advance(index)
+
+async def restore_archived_order(order_id: str, sources: List[str], changes: dict) -> Optional[dict]:
+    """Move an archived order whose status is in `sources` back to db.orders with `changes` applied.
+
+    Returns the order as it was, or None when it is not archived or may not make the change. With its
+    new updated_at the restored order stays hot until it ages past the cutoff again (see archivable).
+    `restored_from` records the month, and tells the order feed the insert is a status change.
+    """
+    month = await archived_order_month(order_id)
+    if month is None:
+        return None
+    archived = await archive_collection(month).find_one({"id": order_id, "status": {"$in": sources}})
+    if archived is None:
+        return None
+    await db.order_rollups.update_one({"_id": month}, {"$set": {"stale": True}})
+    try:
+        await db.orders.insert_one({**archived, **changes, "restored_from": month})
+    except DuplicateKeyError:
+        # A concurrent update restored it first
+        return None
+    await archive_collection(month).delete_one({"id": order_id})
+    await db.archived_orders.delete_one({"_id": order_id})
+    await refresh_rollup(month)
+    archived.pop("_id")
+    return archived
+
+async def paginate_orders(query: dict, projection: dict, limit: int, after: Optional[str], response: Response):
+    """paginate() over db.orders continuing into the monthly archives, in one (created_at, id) order"""
+    if query.get("status") not in (None, *ARCHIVE_STATUSES):
+        return await paginate(db.orders, query, projection, limit, after, response)
+    months = [month for month in await archived_months() if month.get("newest_created_at") is not None]
+    if months and "user_id" in query and await archive_index_ready():
+        held = set(await db.archived_orders.distinct("month", {"user_id": query["user_id"]}))
+        months = [month for month in months if month["_id"] in held]
+    if not months:
+        return await paginate(db.orders, query, projection, limit, after, response)
+    if after:
+        created_at, last_id = decode_cursor(after)
+        # Months that start after the cursor hold nothing older than it
+        months = [month for month in months if month["_id"] <= created_at.astimezone(timezone.utc).strftime("%Y_%m")]
+        query = after_cursor(query, created_at, last_id)
+    docs = await db.orders.find(query, projection).sort(PAGE_ORDER).limit(limit + 1).to_list(limit + 1)
+    for start in range(0, len(months), ARCHIVE_PAGE_FANOUT):
+        # Everything still unread in a month is older than its newest_created_at
+        wave = [
+            month for month in months[start:start + ARCHIVE_PAGE_FANOUT]
+            if len(docs) <= limit or month["newest_created_at"] >= docs[limit]["created_at"]
+        ]
+        if not wave:
+            break
+        pages = await asyncio.gather(*(
+            archive_collection(month["_id"]).find(query, projection).sort(PAGE_ORDER).limit(limit + 1).to_list(limit + 1)
+            for month in wave
+        ))
+        docs += [doc for page in pages for doc in page]
+        docs.sort(key=lambda doc: (doc["created_at"], doc["id"]), reverse=True)
+        del docs[limit + 1:]
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1])
+    return docs
+
+# ============ ANALYTICS ============
+
+# Day and month buckets in analytics_rollups, keyed "day:YYYY-MM-DD" and "month:YYYY-MM" by created_at.
+# Counters under `live` are $inc'ed by the order and subscription write paths for everything created
+# since `live_since` (recorded the first time this code starts); counters under `backfill` are
+# recomputed from orders, archives and subscriptions created before it, so a backfill can be re-run
+# at any time. Readers add the two. Weeks are summed from day buckets.
+ANALYTICS_STATE_ID = "analytics"
+ANALYTICS_COUNTERS = ("orders", "revenue", "cancelled", "cancelled_revenue", "signups", "signup_revenue")
+ANALYTICS_MAX_BUCKETS = 400
+ANALYTICS_DEFAULT_SPAN = {"day": 30, "week": 12, "month": 12}
+
+analytics_live_since: Optional[datetime] = None
+
+def analytics_buckets(created_at: datetime) -> List[tuple]:
+    """(key, granularity, start) of the day and month buckets a timestamp falls in"""
+    day = created_at.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    month = day.replace(day=1)
+    return [(f"day:{day_key(day)}", "day", day), (f"month:{month.strftime('%Y-%m')}", "month", month)]
+
+def order_analytics(order: dict) -> dict:
+    kind, total = order.get("order_type") or "single", order.get("total", 0)
+    return {"orders": 1, "revenue": total, f"by_type.{kind}.orders": 1, f"by_type.{kind}.revenue": total}
+
+async def bump_analytics(entries: List[tuple], batched: bool = False):
+    """Apply (created_at, counter increments) pairs to the live counters, one upsert per touched bucket.
+
+    `batched` queues the upserts on analytics_writes instead of awaiting their own round trip.
+    """
+    ops = {}
+    for created_at, inc in entries:
+        for key, granularity, start in analytics_buckets(created_at):
+            op = ops.setdefault(key, {"$inc": {}, "$setOnInsert": {"granularity": granularity, "start": start}})
+            for name, value in inc.items():
+                op["$inc"][f"live.{name}"] = op["$inc"].get(f"live.{name}", 0) + value
+    if not ops:
+        return
+    updates = [UpdateOne({"_id": key}, update, upsert=True) for key, update in ops.items()]
+    if batched:
+        analytics_writes.submit(updates)
+        return
+    try:
+        await db.analytics_rollups.bulk_write(updates, ordered=False)
+    except Exception as e:
+        logger.warning(f"Failed to update analytics rollups for {len(entries)} writes: {e}")
+
+async def bump_order_cancellations(orders: List[dict]):
+    # Orders created before live_since are counted by the backfill, which reads their current status
+    await bump_analytics([
+        (order["created_at"], {"cancelled": 1, "cancelled_revenue": order.get("total", 0)})
+        for order in orders
+        if analytics_live_since and isinstance(order.get("created_at"), datetime) and order["created_at"] >= analytics_live_since
+    ])
+
+async def init_analytics():
+    global analytics_live_since
+    state = await db.migrations.find_one_and_update(
+        {"_id": ANALYTICS_STATE_ID},
+        {"$setOnInsert": {"live_since": utc_now()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    analytics_live_since = state["live_since"]
+
+def add_counters(into: dict, values: dict) -> dict:
+    for name, value in values.items():
+        if isinstance(value, dict):
+            add_counters(into.setdefault(name, {}), value)
+        else:
+            into[name] = into.get(name, 0) + value
+    return into
+
+async def run_analytics_backfill() -> dict:
+    """Recompute the `backfill` counters of every bucket from data created before live_since"""
+    if analytics_live_since is None:
+        await init_analytics()
+    before = {"created_at": {"$lt": analytics_live_since}}
+    cancelled = {"$eq": ["$status", "cancelled"]}
+    order_pipeline = [{"$match": before}, {"$group": {
+        "_id": {"day": day_of("$created_at"), "type": "$order_type"},
+        "orders": {"$sum": 1},
+        "revenue": {"$sum": "$total"},
+        "cancelled": {"$sum": {"$cond": [cancelled, 1, 0]}},
+        "cancelled_revenue": {"$sum": {"$cond": [cancelled, "$total", 0]}},
+    }}]
+    sources = await order_sources(db, date_to=analytics_live_since)
+    order_rows, signup_rows = await asyncio.gather(
+        asyncio.gather(*(source.aggregate(order_pipeline).to_list(None) for source in sources)),
+        db.subscriptions.aggregate([{"$match": before}, {"$group": {
+            "_id": day_of("$created_at"), "signups": {"$sum": 1}, "signup_revenue": {"$sum": "$price"},
+        }}]).to_list(None),
+    )
+    buckets = {}
+    def add(day: str, values: dict):
+        for key, granularity, start in analytics_buckets(datetime.fromisoformat(day).replace(tzinfo=timezone.utc)):
+            add_counters(buckets.setdefault(key, {"granularity": granularity, "start": start, "backfill": {}})["backfill"], values)
+    for rows in order_rows:
+        for row in rows:
+            if not row["_id"].get("day"):
+                continue
+            kind = row["_id"].get("type") or "single"
+            counters = {name: row[name] for name in ("orders", "revenue", "cancelled", "cancelled_revenue")}
+            add(row["_id"]["day"], {**counters, "by_type": {kind: {"orders": row["orders"], "revenue": row["revenue"]}}})
+    for row in signup_rows:
+        if row["_id"]:
+            add(row["_id"], {"signups": row["signups"], "signup_revenue": row["signup_revenue"]})
+    if buckets:
+        await db.analytics_rollups.bulk_write(
+            [UpdateOne({"_id": key}, {"$set": bucket}, upsert=True) for key, bucket in buckets.items()], ordered=False
+        )
+    await db.analytics_rollups.update_many(
+        {"_id": {"$nin": list(buckets)}, "backfill": {"$exists": True}}, {"$unset": {"backfill": ""}}
+    )
+    state = {"backfilled_at": utc_now(), "buckets": len(buckets)}
+    await db.migrations.update_one({"_id": ANALYTICS_STATE_ID}, {"$set": state})
+    logger.info(f"Analytics backfill wrote {len(buckets)} buckets for data before {analytics_live_since.isoformat()}")
+    return {"live_since": analytics_live_since, **state}
+
+async def run_startup_jobs():
+    """One-off data jobs, in order: timestamps must be dates before the backfill can bucket them"""
+    if MIGRATE_TIMESTAMPS_ON_STARTUP:
+        await run_timestamp_migration()
+    try:
+        state = await db.migrations.find_one({"_id": ANALYTICS_STATE_ID}) or {}
+        if not state.get("backfilled_at") and await acquire_lease("analytics_backfill", 3600):
+            await run_analytics_backfill()
+    except Exception as e:
+        logger.error(f"Analytics backfill failed, run POST /api/admin/analytics/backfill to retry: {e}")
+
+def analytics_period_start(moment: datetime, granularity: str) -> datetime:
+    day = moment.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def next_period(start: datetime, granularity: str) -> datetime:
+    if granularity == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=7 if granularity == "week" else 1)
+
 # ============ AUTH HELPERS ============
 
+_password_pending = 0
+
+async def run_password_task(fn, *args):
+    """Run a bcrypt call on the password pool, shedding load with 503 when the queue is full"""
+    global _password_pending
+    if _password_pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, please retry",
+            headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+        )
+    _password_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, fn, *args)
+    finally:
+        _password_pending -= 1
+
+async def hash_password(password: str) -> str:
+    return await run_password_task(pwd_context.hash, password)
+
+async def verify_password(password: str, password_hash: str):
+    """Returns (valid, new_hash); new_hash is set when the stored hash uses outdated settings"""
+    if not password_hash:
+        return False, None
+    return await run_password_task(pwd_context.verify_and_update, password, password_hash)
+
 def create_token(user_id: str, role: str):
     expire = datetime.now(timezone.utc) + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
     return jwt.encode({"sub": user_id, "role": role, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def decode_token(credentials: HTTPAuthorizationCredentials) -> dict:
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
+
+async def load_user(user_id: str):
+    user = user_cache.get(user_id) if cache_bus.in_sync() else None
+    if user is None:
         user = await db.users.find_one({"id": user_id}, {"_id": 0})
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
-        return user
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        user_cache.set(user_id, user)
+    return user
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    payload = decode_token(credentials)
+    return await load_user(payload["sub"])
 
 async def require_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
     user = await get_current_user(credentials)
@@ -125,6 +2295,19 @@ async def require_admin(credentials: HTTPAuthorizationCredentials = Depends(secu
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
 
+async def get_token_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Identity for read-only routes; skips the user lookup entirely when TRUST_TOKEN_CLAIMS is on"""
+    payload = decode_token(credentials)
+    if TRUST_TOKEN_CLAIMS:
+        return {"id": payload["sub"], "role": payload.get("role", "customer")}
+    return await load_user(payload["sub"])
+
+async def require_admin_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    user = await get_token_user(credentials)
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
 # ============ AUTH ROUTES ============
 
 @api_router.post("/auth/register")
@@ -139,13 +2322,14 @@ async def register(data: UserRegister):
         "name": data.name,
         "email": data.email,
         "phone": data.phone,
-        "password_hash": pwd_context.hash(data.password),
+        "password_hash": await hash_password(data.password),
         "address": data.address or "",
         "role": "customer",
         "language_pref": "en",
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": utc_now(),
     }
     await db.users.insert_one(user)
+    await bump_stats({"customers": 1})
     token = create_token(user_id, "customer")
     return {
         "token": token,
@@ -155,8 +2339,15 @@ async def register(data: UserRegister):
 @api_router.post("/auth/login")
 async def login(data: UserLogin):
     user = await db.users.find_one({"email": data.email})
-    if not user or not pwd_context.verify(data.password, user.get("password_hash", "")):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await verify_password(data.password, user.get("password_hash", ""))
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Cost factor changed since this hash was stored - upgrade it transparently
+        await db.users.update_one({"id": user["id"]}, {"$set": {"password_hash": new_hash}})
+        invalidate_user(user["id"])
     
     token = create_token(user["id"], user.get("role", "customer"))
     user_data = {k: v for k, v in user.items() if k not in ("password_hash", "_id")}
@@ -171,34 +2362,38 @@ async def update_profile(data: UserUpdate, user=Depends(get_current_user)):
     update = {k: v for k, v in data.dict().items() if v is not None}
     if update:
         await db.users.update_one({"id": user["id"]}, {"$set": update})
+        invalidate_user(user["id"])
     updated = await db.users.find_one({"id": user["id"]}, {"_id": 0, "password_hash": 0})
     return updated
 
 # ============ MENU ROUTES ============
 
 @api_router.get("/menu")
-async def get_menu(day: Optional[str] = None):
-    query = {"is_available": True}
-    if day:
-        query["$or"] = [{"day_of_week": day.lower()}, {"day_of_week": "daily"}]
-    items = await db.menu_items.find(query, {"_id": 0}).to_list(200)
-    return items
+async def get_menu(request: Request, day: Optional[str] = None, since: Optional[str] = None):
+    day = day.lower() if day else None
+    if since:
+        def keep(item):
+            return item.get("is_available") and (day is None or item.get("day_of_week") in (day, "daily"))
+        return json_response(await delta_sync(db.menu_items, {}, since, SYNC_LIST_LIMIT, keep, tombstones=True))
+    watermark = sync_watermark()
+    body, etag = await menu_snapshot.get(day or MenuSnapshot.ALL)
+    response = etag_response(request, body, etag)
+    set_sync_watermark(response, watermark)
+    return response
 
 @api_router.get("/menu/weekly")
-async def get_weekly_menu():
-    items = await db.menu_items.find({"is_available": True}, {"_id": 0}).to_list(500)
-    days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-    weekly = {}
-    for day in days:
-        weekly[day] = [i for i in items if i.get("day_of_week") == day or i.get("day_of_week") == "daily"]
-    return weekly
+async def get_weekly_menu(request: Request):
+    body, etag = await menu_snapshot.get(MenuSnapshot.WEEKLY)
+    return etag_response(request, body, etag)
 
 @api_router.post("/menu")
 async def create_menu_item(data: MenuItemCreate, admin=Depends(require_admin)):
     item = data.dict()
     item["id"] = str(uuid.uuid4())
-    item["created_at"] = datetime.now(timezone.utc).isoformat()
+    item["created_at"] = item["updated_at"] = utc_now()
     await db.menu_items.insert_one(item)
+    invalidate_menu()
+    invalidate_forecast()
     return {k: v for k, v in item.items() if k != "_id"}
 
 @api_router.put("/menu/{item_id}")
@@ -206,9 +2401,12 @@ async def update_menu_item(item_id: str, data: MenuItemUpdate, admin=Depends(req
     update = {k: v for k, v in data.dict().items() if v is not None}
     if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
+    update["updated_at"] = utc_now()
     result = await db.menu_items.update_one({"id": item_id}, {"$set": update})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Menu item not found")
+    invalidate_menu()
+    invalidate_forecast()
     updated = await db.menu_items.find_one({"id": item_id}, {"_id": 0})
     return updated
 
@@ -217,83 +2415,266 @@ async def delete_menu_item(item_id: str, admin=Depends(require_admin)):
     result = await db.menu_items.delete_one({"id": item_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Menu item not found")
+    await record_tombstone("menu_items", item_id)
+    invalidate_menu()
+    invalidate_forecast()
     return {"message": "Deleted"}
 
 # ============ PLANS ROUTES ============
 
 @api_router.get("/plans")
-async def get_plans():
-    plans = await db.subscription_plans.find({"is_active": True}, {"_id": 0}).to_list(50)
-    return plans
+async def get_plans(response: Response, since: Optional[str] = None):
+    if since:
+        return json_response(await delta_sync(
+            db.subscription_plans, {}, since, SYNC_LIST_LIMIT, keep=lambda plan: plan.get("is_active")
+        ))
+    set_sync_watermark(response, sync_watermark())
+    plans = await read_db.subscription_plans.find({"is_active": True}, {"_id": 0}).to_list(50)
+    return json_response(plans, response)
 
 @api_router.post("/plans")
 async def create_plan(data: PlanCreate, admin=Depends(require_admin)):
     plan = data.dict()
     plan["id"] = str(uuid.uuid4())
-    plan["created_at"] = datetime.now(timezone.utc).isoformat()
+    plan["created_at"] = plan["updated_at"] = utc_now()
     await db.subscription_plans.insert_one(plan)
+    invalidate_plans()
     return {k: v for k, v in plan.items() if k != "_id"}
 
 @api_router.put("/plans/{plan_id}")
 async def update_plan(plan_id: str, data: dict, admin=Depends(require_admin)):
-    result = await db.subscription_plans.update_one({"id": plan_id}, {"$set": data})
+    result = await db.subscription_plans.update_one({"id": plan_id}, {"$set": {**data, "updated_at": utc_now()}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Plan not found")
+    invalidate_plans()
+    invalidate_forecast()
     updated = await db.subscription_plans.find_one({"id": plan_id}, {"_id": 0})
     return updated
 
 # ============ ORDER ROUTES ============
 
+# Order lists leave out items, addresses and notes unless asked for with ?fields= (GET /orders/{id} has them all)
+ORDER_LIST_FIELDS = ("updated_at", "user_name", "order_type", "status", "payment_status", "total")
+
 @api_router.post("/orders")
-async def create_order(data: OrderCreate, user=Depends(get_current_user)):
+async def create_order(
+    data: OrderCreate,
+    user=Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    return await run_idempotent("orders", user["id"], idempotency_key, data.dict(), lambda: insert_order(data, user))
+
+async def insert_order(data: OrderCreate, user: dict):
+    items, total = price_order(data.items, await price_table.get())
+    if data.total is not None and abs(data.total - total) > 0.005:
+        # Prices changed since the client rendered them; it must show the new total before charging
+        raise HTTPException(status_code=409, detail=f"Order total is {total}, not {data.total}")
     order = {
         "id": str(uuid.uuid4()),
         "user_id": user["id"],
         "user_name": user.get("name", ""),
         "user_phone": user.get("phone", ""),
-        "items": data.items,
-        "total": data.total,
+        "items": items,
+        "total": total,
         "order_type": data.order_type,
         "delivery_address": data.delivery_address or user.get("address", ""),
         "notes": data.notes or "",
         "status": "pending",
         "payment_status": "paid",
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": utc_now(),
+        "updated_at": utc_now(),
     }
-    await db.orders.insert_one(order)
+    if ORDER_INSERT_BATCHING:
+        await order_writes.insert(order)
+    else:
+        await db.orders.insert_one(order)
+    # Batched counter updates are queued, not awaited: they are best-effort either way
+    await bump_analytics([(order["created_at"], order_analytics(order))], batched=ORDER_INSERT_BATCHING)
+    await bump_stats({
+        "orders_total": 1,
+        "orders_by_status.pending": 1,
+        "revenue": order["total"],
+        f"orders_by_day.{day_key(order['created_at'])}": 1,
+    }, batched=ORDER_INSERT_BATCHING)
+    order_feed.publish_local("insert", {k: order[k] for k in ORDER_FEED_FIELDS})
     return {k: v for k, v in order.items() if k != "_id"}
 
 @api_router.get("/orders")
-async def get_user_orders(user=Depends(get_current_user)):
-    orders = await db.orders.find({"user_id": user["id"]}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return orders
+async def get_user_orders(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    since: Optional[str] = None,
+    user=Depends(get_token_user)
+):
+    if since:
+        return json_response(await delta_sync(db.orders, {"user_id": user["id"]}, since, limit, projection=list_projection(fields, default=ORDER_LIST_FIELDS)))
+    if not after:
+        set_sync_watermark(response, sync_watermark())
+    orders = await paginate_orders({"user_id": user["id"]}, list_projection(fields, default=ORDER_LIST_FIELDS), limit, after, response)
+    return json_response(orders, response)
 
 @api_router.get("/orders/all")
 async def get_all_orders(
+    response: Response,
     status: Optional[str] = None,
-    admin=Depends(require_admin)
+    limit: int = Query(500, ge=1, le=1000),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    since: Optional[str] = None,
+    admin=Depends(require_admin_token)
 ):
+    if since:
+        # Not filtered by status in the query, so orders that moved out of the status come back as deleted
+        projection = list_projection(fields, default=ORDER_LIST_FIELDS)
+        keep = (lambda order: order.get("status") == status) if status else None
+        return json_response(await delta_sync(db.orders, {}, since, limit, keep, projection))
+    if not after:
+        set_sync_watermark(response, sync_watermark())
     query = {}
     if status:
         query["status"] = status
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(500)
-    return orders
+    orders = await paginate_orders(query, list_projection(fields, default=ORDER_LIST_FIELDS), limit, after, response)
+    return json_response(orders, response)
+
+@api_router.get("/orders/feed")
+async def order_feed_events(
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    admin=Depends(require_admin_token)
+):
+    """Server-sent events: `insert` for new orders, `status` for status transitions"""
+    return StreamingResponse(
+        order_feed_stream(last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Orders move forward one step at a time; cancellation is allowed from any other state
+ORDER_TRANSITIONS = {
+    "pending": ("preparing", "cancelled"),
+    "preparing": ("out_for_delivery", "cancelled"),
+    "out_for_delivery": ("delivered", "cancelled"),
+    "delivered": ("cancelled",),
+    "cancelled": (),
+}
+ORDER_BULK_STATUS_LIMIT = 500
+
+def order_status_sources(status: str) -> List[str]:
+    """States an order may move to `status` from; an unknown status is a 400"""
+    if status not in ORDER_TRANSITIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid status: {status}")
+    return [source for source, targets in ORDER_TRANSITIONS.items() if status in targets]
+
+def status_outcome(current: Optional[str], status: str) -> str:
+    """Why an order was not moved to `status`, given its current status (None when it does not exist)"""
+    if current is None:
+        return "not_found"
+    return "unchanged" if current == status else "invalid_transition"
+
+async def after_status_changes(moved: List[dict], status: str, now: datetime):
+    """Stats, analytics, forecast and order feed bookkeeping for orders (as they were before) moved to `status`"""
+    if not moved:
+        return
+    inc = {f"orders_by_status.{status}": len(moved)}
+    for order in moved:
+        key = f"orders_by_status.{order.get('status')}"
+        inc[key] = inc.get(key, 0) - 1
+    await bump_stats(inc)
+    if status == "cancelled":
+        await bump_order_cancellations(moved)
+    if status == "cancelled" or any(order.get("status") == "cancelled" for order in moved):
+        invalidate_forecast()
+    for order in moved:
+        order_feed.publish_local("status", {"id": order["id"], "status": status, "updated_at": now})
+
+@api_router.put("/orders/status")
+async def bulk_update_order_status(data: OrderBulkStatusUpdate, admin=Depends(require_admin)):
+    """Apply one transition to many orders; `results` maps each id to updated, unchanged, invalid_transition or not_found"""
+    sources = order_status_sources(data.status)
+    order_ids = list(dict.fromkeys(data.order_ids))
+    if not order_ids or len(order_ids) > ORDER_BULK_STATUS_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {ORDER_BULK_STATUS_LIMIT} order ids")
+    current = {
+        doc["id"]: doc
+        async for doc in db.orders.find(
+            {"id": {"$in": order_ids}}, {"_id": 0, "id": 1, "status": 1, "total": 1, "order_type": 1, "created_at": 1}
+        )
+    }
+    eligible = [order_id for order_id in order_ids if order_id in current and current[order_id].get("status") in sources]
+    results = {
+        order_id: status_outcome(current[order_id].get("status") if order_id in current else None, data.status)
+        for order_id in order_ids
+    }
+    now = utc_now()
+    moved = []
+    if eligible:
+        # Each update is conditional on the status just read, so the stats deltas below are exact
+        result = await db.orders.bulk_write([
+            UpdateOne(
+                {"id": order_id, "status": current[order_id].get("status")},
+                {"$set": {"status": data.status, "updated_at": now}},
+            ) for order_id in eligible
+        ], ordered=False)
+        moved = [current[order_id] for order_id in eligible]
+        if result.modified_count != len(eligible):
+            # Some orders changed between the read and the write; see which updates landed
+            landed = {
+                doc["id"]: doc.get("status")
+                async for doc in db.orders.find(
+                    {"id": {"$in": eligible}}, {"_id": 0, "id": 1, "status": 1, "updated_at": 1}
+                ) if doc.get("status") == data.status and doc.get("updated_at") == now
+            }
+            moved = [order for order in moved if order["id"] in landed]
+            for order_id in eligible:
+                if order_id not in landed:
+                    results[order_id] = "invalid_transition"
+    missing = [order_id for order_id in order_ids if order_id not in current]
+    if missing:
+        archived_ids = [entry["_id"] async for entry in db.archived_orders.find({"_id": {"$in": missing}}, {"_id": 1})]
+        for order_id in archived_ids:
+            before = await restore_archived_order(order_id, sources, {"status": data.status, "updated_at": now})
+            if before is not None:
+                moved.append(before)
+            else:
+                archived = await db.orders.find_one({"id": order_id}, {"_id": 0, "status": 1}) or await find_archived_order(order_id)
+                results[order_id] = status_outcome(archived and archived.get("status"), data.status)
+    for order in moved:
+        results[order["id"]] = "updated"
+    await after_status_changes(moved, data.status, now)
+    return {"status": data.status, "updated": len(moved), "results": results}
 
 @api_router.put("/orders/{order_id}/status")
 async def update_order_status(order_id: str, data: OrderStatusUpdate, admin=Depends(require_admin)):
-    result = await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"status": data.status, "updated_at": datetime.now(timezone.utc).isoformat()}}
+    sources = order_status_sources(data.status)
+    changes = {"status": data.status, "updated_at": utc_now()}
+    before = await db.orders.find_one_and_update(
+        {"id": order_id, "status": {"$in": sources}},
+        {"$set": changes},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE,
     )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Order not found")
-    updated = await db.orders.find_one({"id": order_id}, {"_id": 0})
-    return updated
+    if before is None:
+        # Not hot: a settled order may have been archived (delivered -> cancelled is still allowed)
+        before = await restore_archived_order(order_id, sources, changes)
+    if before is None:
+        # Only a rejected update pays for the reads that explain why
+        current = await db.orders.find_one({"id": order_id}, {"_id": 0}) or await find_archived_order(order_id)
+        outcome = status_outcome(current and current.get("status"), data.status)
+        if outcome == "not_found":
+            raise HTTPException(status_code=404, detail="Order not found")
+        if outcome == "unchanged":
+            return current
+        raise HTTPException(
+            status_code=409, detail=f"Cannot change order status from {current.get('status')} to {data.status}"
+        )
+    await after_status_changes([before], data.status, changes["updated_at"])
+    return {**before, **changes}
 
 @api_router.get("/orders/{order_id}")
-async def get_order(order_id: str, user=Depends(get_current_user)):
-    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+async def get_order(order_id: str, user=Depends(get_token_user)):
+    order = await db.orders.find_one({"id": order_id}, {"_id": 0}) or await find_archived_order(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if user.get("role") != "admin" and order.get("user_id") != user["id"]:
@@ -303,12 +2684,21 @@ async def get_order(order_id: str, user=Depends(get_current_user)):
 # ============ SUBSCRIPTION ROUTES ============
 
 @api_router.post("/subscriptions")
-async def create_subscription(data: SubscriptionCreate, user=Depends(get_current_user)):
+async def create_subscription(
+    data: SubscriptionCreate,
+    user=Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    return await run_idempotent(
+        "subscriptions", user["id"], idempotency_key, data.dict(), lambda: insert_subscription(data, user)
+    )
+
+async def insert_subscription(data: SubscriptionCreate, user: dict):
     plan = await db.subscription_plans.find_one({"id": data.plan_id}, {"_id": 0})
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
     
-    start = datetime.now(timezone.utc) if not data.start_date else datetime.fromisoformat(data.start_date)
+    start = utc_now() if not data.start_date else parse_iso_utc(data.start_date, "start_date")
     end = start + timedelta(days=plan["duration_days"])
     
     sub = {
@@ -319,60 +2709,273 @@ async def create_subscription(data: SubscriptionCreate, user=Depends(get_current
         "plan_name_en": plan.get("name_en", ""),
         "plan_name_mr": plan.get("name_mr", ""),
         "price": plan["price"],
-        "start_date": start.isoformat(),
-        "end_date": end.isoformat(),
+        "start_date": start,
+        "end_date": end,
         "status": "active",
         "payment_status": "paid",
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": utc_now(),
+        "updated_at": utc_now(),
     }
     await db.subscriptions.insert_one(sub)
+    await bump_analytics([(sub["created_at"], {"signups": 1, "signup_revenue": sub["price"]})])
+    await bump_stats({"active_subscriptions": 1})
+    invalidate_forecast()
     return {k: v for k, v in sub.items() if k != "_id"}
 
 @api_router.get("/subscriptions")
-async def get_user_subscriptions(user=Depends(get_current_user)):
+async def get_user_subscriptions(response: Response, since: Optional[str] = None, user=Depends(get_token_user)):
+    if since:
+        return json_response(await delta_sync(db.subscriptions, {"user_id": user["id"]}, since, SYNC_LIST_LIMIT))
+    set_sync_watermark(response, sync_watermark())
     subs = await db.subscriptions.find({"user_id": user["id"]}, {"_id": 0}).sort("created_at", -1).to_list(50)
-    return subs
+    return json_response(subs, response)
 
 @api_router.get("/subscriptions/all")
-async def get_all_subscriptions(admin=Depends(require_admin)):
-    subs = await db.subscriptions.find({}, {"_id": 0}).sort("created_at", -1).to_list(500)
-    return subs
+async def get_all_subscriptions(
+    response: Response,
+    limit: int = Query(500, ge=1, le=1000),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    admin=Depends(require_admin_token)
+):
+    subs = await paginate(db.subscriptions, {}, list_projection(fields), limit, after, response)
+    return json_response(subs, response)
+
+# ============ HOME BUNDLE ============
+
+HOME_RECENT_ORDERS = 5
+HOME_PLAN_FIELDS = ("id", "name_en", "name_mr", "description_en", "description_mr", "price", "duration_days", "meals_per_day")
+HOME_SUBSCRIPTION_FIELDS = ("id", "plan_id", "plan_name_en", "plan_name_mr", "start_date", "end_date", "status")
+HOME_ORDER_FIELDS = ("id", "items", "total", "order_type", "status", "created_at")
+
+async def home_menu(day: str):
+    body, _ = await menu_snapshot.get(day)
+    # Embedded as the snapshot's serialized bytes, so the cached menu is not parsed back into dicts
+    return orjson.Fragment(body)
+
+async def home_active_subscription(user_id: str):
+    return await db.subscriptions.find_one(
+        {"user_id": user_id, "status": "active", "end_date": {"$gt": utc_now()}},
+        {"_id": 0, **{f: 1 for f in HOME_SUBSCRIPTION_FIELDS}},
+        sort=[("created_at", -1)],
+    )
+
+@api_router.get("/home")
+async def get_home(day: Optional[str] = None, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Everything the app's home screen needs in one round-trip, fetched concurrently"""
+    user_id = decode_token(credentials)["sub"]
+    day = day.lower() if day else WEEK_DAYS[datetime.now(timezone.utc).weekday()]
+    user, menu, plans, subscription, orders = await asyncio.gather(
+        load_user(user_id),
+        home_menu(day),
+        read_db.subscription_plans.find({"is_active": True}, {"_id": 0, **{f: 1 for f in HOME_PLAN_FIELDS}}).to_list(50),
+        home_active_subscription(user_id),
+        db.orders.find({"user_id": user_id}, {"_id": 0, **{f: 1 for f in HOME_ORDER_FIELDS}})
+            .sort([("created_at", -1), ("id", -1)]).limit(HOME_RECENT_ORDERS).to_list(HOME_RECENT_ORDERS),
+    )
+    return json_response({
+        "user": {k: v for k, v in user.items() if k != "password_hash"},
+        "day": day,
+        "menu": menu,
+        "plans": plans,
+        "active_subscription": subscription,
+        "recent_orders": orders,
+    })
 
 # ============ ADMIN ROUTES ============
 
 @api_router.get("/admin/dashboard")
-async def admin_dashboard(admin=Depends(require_admin)):
-    total_orders = await db.orders.count_documents({})
-    pending_orders = await db.orders.count_documents({"status": "pending"})
-    preparing_orders = await db.orders.count_documents({"status": "preparing"})
-    delivered_orders = await db.orders.count_documents({"status": "delivered"})
-    total_customers = await db.users.count_documents({"role": "customer"})
-    active_subs = await db.subscriptions.count_documents({"status": "active"})
-    
-    # Revenue
-    pipeline = [{"$group": {"_id": None, "total": {"$sum": "$total"}}}]
-    revenue_result = await db.orders.aggregate(pipeline).to_list(1)
-    total_revenue = revenue_result[0]["total"] if revenue_result else 0
-    
-    # Today's orders
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    today_orders = await db.orders.count_documents({"created_at": {"$gte": today_start.isoformat()}})
-    
+async def admin_dashboard(admin=Depends(require_admin_token)):
+    stats = await read_materialized_stats() if MATERIALIZED_STATS else await compute_dashboard_stats(read_db)
+    return dashboard_response(stats)
+
+@api_router.post("/admin/stats/reconcile")
+async def reconcile_dashboard_stats(admin=Depends(require_admin)):
+    result = await reconcile_stats()
+    return {"drift": result["drift"], "dashboard": dashboard_response(result["stats"])}
+
+@api_router.get("/admin/customers")
+async def get_customers(
+    response: Response,
+    limit: int = Query(500, ge=1, le=1000),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    admin=Depends(require_admin_token)
+):
+    projection = list_projection(fields, hidden=("password_hash",))
+    customers = await paginate(db.users, {"role": "customer"}, projection, limit, after, response)
+    return json_response(customers, response)
+
+@api_router.get("/admin/cache-stats")
+async def cache_stats(admin=Depends(require_admin_token)):
+    return {"users": user_cache.stats(), "trust_token_claims": TRUST_TOKEN_CLAIMS, "cache_bus": cache_bus.stats()}
+
+@api_router.get("/admin/indexes")
+async def index_usage(admin=Depends(require_admin_token)):
+    """$indexStats per collection, plus declared indexes that are missing and undeclared extras"""
+    report = {}
+    for collection, models in INDEX_SPECS.items():
+        stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+        declared = {m.document["name"] for m in models}
+        present = {st["name"] for st in stats}
+        report[collection] = {
+            "indexes": [
+                {
+                    "name": st["name"],
+                    "key": st.get("key", {}),
+                    "ops": st.get("accesses", {}).get("ops", 0),
+                    "since": st.get("accesses", {}).get("since"),
+                }
+                for st in stats
+            ],
+            "unused": sorted(st["name"] for st in stats if st.get("accesses", {}).get("ops", 0) == 0),
+            "missing": sorted(declared - present),
+            "undeclared": sorted(present - declared - {"_id_"}),
+        }
+    return report
+
+@api_router.get("/admin/export/{dataset}")
+async def export_data(
+    dataset: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    status: Optional[str] = None,
+    compress: bool = Query(False, alias="gzip"),
+    admin=Depends(require_admin_token)
+):
+    """Stream a full CSV/NDJSON export filtered by created_at range [date_from, date_to) and status"""
+    spec = EXPORTS.get(dataset)
+    if not spec:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    query = dict(spec["query"])
+    created = {}
+    if date_from:
+        created["$gte"] = parse_iso_utc(date_from, "date_from")
+    if date_to:
+        created["$lt"] = parse_iso_utc(date_to, "date_to")
+    if created:
+        query["created_at"] = created
+    if status and "status" in spec["columns"]:
+        query["status"] = status
+    projection = {"_id": 0, **{c: 1 for c in spec["columns"]}}
+    collections = [read_db[spec["collection"]]]
+    if spec.get("archived") and query.get("status") in (None, *ARCHIVE_STATUSES):
+        collections = await order_sources(read_db, created.get("$gte"), created.get("$lt"))
+    cursors = [
+        collection.find(query, projection).sort("created_at", 1).batch_size(EXPORT_BATCH_SIZE)
+        for collection in collections
+    ]
+    rows = cursors[0] if len(cursors) == 1 else merge_by_created_at(cursors)
+    body = export_rows(rows, spec["columns"], format)
+    filename = f"{dataset}.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    if compress:
+        body = gzip_chunks(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@api_router.get("/admin/forecast")
+async def kitchen_forecast(
+    days: int = Query(7, ge=1, le=31),
+    lookback_days: int = Query(56, ge=7, le=365),
+    admin=Depends(require_admin_token)
+):
+    key = (day_key(datetime.now(timezone.utc)), days, lookback_days)
+    result = forecast_cache.get(key) if cache_bus.in_sync() else None
+    if result is None:
+        result = await compute_forecast(days, lookback_days)
+        forecast_cache.set(key, result)
+    return result
+
+@api_router.post("/admin/manifests/build")
+async def build_manifests(admin=Depends(require_admin)):
+    result = await run_manifest_job()
+    if result is None:
+        raise HTTPException(status_code=409, detail="A manifest build is already running", headers={"Retry-After": "5"})
+    return result
+
+@api_router.get("/admin/analytics")
+async def admin_analytics(
+    granularity: str = Query("day", pattern="^(day|week|month)$"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    admin=Depends(require_admin_token)
+):
+    """Orders, revenue by order type, cancellations and signups per period over [date_from, date_to)"""
+    end = parse_iso_utc(date_to, "date_to") if date_to else utc_today_start() + timedelta(days=1)
+    end = next_period(analytics_period_start(end - timedelta(microseconds=1), granularity), granularity)
+    if date_from:
+        start = analytics_period_start(parse_iso_utc(date_from, "date_from"), granularity)
+    else:
+        start = end
+        for _ in range(ANALYTICS_DEFAULT_SPAN[granularity]):
+            start = analytics_period_start(start - timedelta(days=1), granularity)
+    stored = "month" if granularity == "month" else "day"
+    span = (end - start).days if stored == "day" else (end.year - start.year) * 12 + end.month - start.month
+    if span <= 0 or span > ANALYTICS_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Range must cover 1 to {ANALYTICS_MAX_BUCKETS} {stored}s")
+
+    docs = await read_db.analytics_rollups.find(
+        {"granularity": stored, "start": {"$gte": start, "$lt": end}}, {"_id": 0, "start": 1, "live": 1, "backfill": 1}
+    ).sort("start", 1).to_list(ANALYTICS_MAX_BUCKETS)
+    periods = {}
+    period = start
+    while period < end:
+        periods[period] = {name: 0 for name in ANALYTICS_COUNTERS}
+        periods[period]["by_type"] = {}
+        period = next_period(period, granularity)
+    totals = {name: 0 for name in ANALYTICS_COUNTERS}
+    totals["by_type"] = {}
+    for doc in docs:
+        values = add_counters(add_counters({}, doc.get("backfill", {})), doc.get("live", {}))
+        add_counters(periods[analytics_period_start(doc["start"], granularity)], values)
+        add_counters(totals, values)
+    buckets = [
+        {"start": day_key(period), **values, "net_revenue": values["revenue"] - values["cancelled_revenue"]}
+        for period, values in periods.items()
+    ]
+    totals["net_revenue"] = totals["revenue"] - totals["cancelled_revenue"]
+    return json_response({"granularity": granularity, "from": start, "to": end, "buckets": buckets, "totals": totals})
+
+@api_router.post("/admin/analytics/backfill")
+async def analytics_backfill(admin=Depends(require_admin)):
+    return await run_analytics_backfill()
+
+@api_router.post("/admin/archive/run")
+async def archive_orders(admin=Depends(require_admin)):
+    """Run the order archiver now; the dashboard totals must not change"""
+    return await run_archive_job()
+
+@api_router.get("/admin/manifests/{date}")
+async def get_delivery_manifest(date: str, admin=Depends(require_admin_token)):
+    """Deliveries for one day grouped by area; reads only that day's rows, already sorted by the index"""
+    date = day_key(parse_iso_utc(date, "date"))
+    cursor = read_db.delivery_manifests.find(
+        {"date": date}, {"_id": 0, "date": 0, "run_id": 0, "generated_at": 0}
+    ).sort([("area", ASCENDING), ("user_name", ASCENDING)])
+    areas = []
+    async for row in cursor:
+        if not areas or areas[-1]["area"] != row["area"]:
+            areas.append({"area": row["area"], "deliveries": 0, "meals": 0, "stops": []})
+        group = areas[-1]
+        group["deliveries"] += 1
+        group["meals"] += row.get("meals", 1)
+        group["stops"].append(row)
     return {
-        "total_orders": total_orders,
-        "pending_orders": pending_orders,
-        "preparing_orders": preparing_orders,
-        "delivered_orders": delivered_orders,
-        "total_customers": total_customers,
-        "active_subscriptions": active_subs,
-        "total_revenue": total_revenue,
-        "today_orders": today_orders,
+        "date": date,
+        "total_deliveries": sum(a["deliveries"] for a in areas),
+        "total_meals": sum(a["meals"] for a in areas),
+        "areas": areas,
     }
 
-@api_router.get("/admin/customers")
-async def get_customers(admin=Depends(require_admin)):
-    customers = await db.users.find({"role": "customer"}, {"_id": 0, "password_hash": 0}).to_list(500)
-    return customers
+@api_router.get("/admin/migrations/timestamps")
+async def timestamp_migration_status(admin=Depends(require_admin_token)):
+    state = await db.migrations.find_one({"_id": MIGRATION_ID}, {"_id": 0}) or {"done": False}
+    for progress in (state.get("collections") or {}).values():
+        progress.pop("last_id", None)
+    return state
 
 # ============ MOCK PAYMENT ============
 
@@ -405,11 +3008,11 @@ async def seed_data():
         "name": "Admin",
         "email": "admin@gurukrupa.com",
         "phone": "9876543210",
-        "password_hash": pwd_context.hash("admin123"),
+        "password_hash": await hash_password("admin123"),
         "address": "Gurukrupa Mess, Pune",
         "role": "admin",
         "language_pref": "en",
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": utc_now(),
     }
     await db.users.insert_one(admin_user)
     
@@ -420,11 +3023,11 @@ async def seed_data():
         "name": "Rahul Patil",
         "email": "rahul@test.com",
         "phone": "9876543211",
-        "password_hash": pwd_context.hash("test123"),
+        "password_hash": await hash_password("test123"),
         "address": "Flat 301, Sunrise Apartments, Kothrud, Pune",
         "role": "customer",
         "language_pref": "en",
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": utc_now(),
     }
     await db.users.insert_one(customer)
     
@@ -448,8 +3051,10 @@ async def seed_data():
     
     for item in menu_items:
         item["id"] = str(uuid.uuid4())
-        item["created_at"] = datetime.now(timezone.utc).isoformat()
+        item["created_at"] = item["updated_at"] = utc_now()
     await db.menu_items.insert_many(menu_items)
+    invalidate_menu()
+    invalidate_forecast()
     
     # Seed subscription plans
     plans = [
@@ -463,7 +3068,8 @@ async def seed_data():
             "duration_days": 7,
             "meals_per_day": 1,
             "is_active": True,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": utc_now(),
+            "updated_at": utc_now(),
         },
         {
             "id": str(uuid.uuid4()),
@@ -475,7 +3081,8 @@ async def seed_data():
             "duration_days": 30,
             "meals_per_day": 1,
             "is_active": True,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": utc_now(),
+            "updated_at": utc_now(),
         },
         {
             "id": str(uuid.uuid4()),
@@ -487,10 +3094,12 @@ async def seed_data():
             "duration_days": 30,
             "meals_per_day": 2,
             "is_active": True,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": utc_now(),
+            "updated_at": utc_now(),
         },
     ]
     await db.subscription_plans.insert_many(plans)
+    invalidate_plans()
     
     # Create some demo orders
     demo_orders = [
@@ -506,8 +3115,8 @@ async def seed_data():
             "notes": "",
             "status": "delivered",
             "payment_status": "paid",
-            "created_at": (datetime.now(timezone.utc) - timedelta(days=2)).isoformat(),
-            "updated_at": (datetime.now(timezone.utc) - timedelta(days=2)).isoformat(),
+            "created_at": utc_now() - timedelta(days=2),
+            "updated_at": utc_now() - timedelta(days=2),
         },
         {
             "id": str(uuid.uuid4()),
@@ -521,25 +3130,93 @@ async def seed_data():
             "notes": "Extra chapati please",
             "status": "preparing",
             "payment_status": "paid",
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": utc_now(),
+            "updated_at": utc_now(),
         },
     ]
     await db.orders.insert_many(demo_orders)
+    if MATERIALIZED_STATS:
+        await reconcile_stats()
+    # Back-dated demo orders belong to the backfill, the rest to the live counters
+    await bump_analytics([
+        (order["created_at"], order_analytics(order)) for order in demo_orders if order["created_at"] >= analytics_live_since
+    ])
+    await run_analytics_backfill()
     
     return {"message": "Seed data created successfully", "admin_email": "admin@gurukrupa.com", "admin_password": "admin123", "customer_email": "rahul@test.com", "customer_password": "test123"}
 
+@api_router.get("/health")
+async def health(response: Response):
+    """Liveness of the Mongo connection plus pool occupancy; 503 when the server cannot be reached"""
+    mongo = {}
+    started = time.perf_counter()
+    try:
+        # Server selection normally gives up first and reports why; the outer bound covers a hung socket
+        await asyncio.wait_for(client.admin.command("ping"), MONGO_SERVER_SELECTION_TIMEOUT_MS / 1000 + 1)
+        mongo["ping_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    except Exception as e:
+        mongo["error"] = f"{type(e).__name__}: {str(e)[:200]}"
+        response.status_code = 503
+    servers = pool_monitor.snapshot()
+    for server in servers.values():
+        server["utilization"] = round(server["checked_out"] / MONGO_MAX_POOL_SIZE, 3)
+    return {
+        "status": "degraded" if "error" in mongo else "ok",
+        "mongo": mongo,
+        "pool": {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "checked_out": sum(s["checked_out"] for s in servers.values()),
+            "waiting": sum(s["waiting"] for s in servers.values()),
+            "servers": servers,
+        },
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    for address, server in pool_monitor.snapshot().items():
+        labels = (("server", address),)
+        metrics.gauge_set("mongo_pool_open_connections", labels, server["open"])
+        metrics.gauge_set("mongo_pool_checked_out_connections", labels, server["checked_out"])
+        metrics.gauge_set("mongo_pool_waiting_requests", labels, server["waiting"])
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Include router and middleware
 app.include_router(api_router)
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", NEXT_CURSOR_HEADER, SYNC_WATERMARK_HEADER],
 )
 
+@app.on_event("startup")
+async def startup_services():
+    await ensure_indexes()
+    order_feed.start()
+    cache_bus.start()
+    await init_analytics()
+    asyncio.create_task(run_startup_jobs())
+    if MATERIALIZED_STATS and STATS_RECONCILE_INTERVAL_SECONDS > 0:
+        asyncio.create_task(stats_reconcile_loop())
+    if MANIFEST_INTERVAL_SECONDS > 0:
+        asyncio.create_task(manifest_loop())
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        asyncio.create_task(archive_loop())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for batcher in WRITE_BATCHERS:
+        await batcher.drain()
+    order_feed.stop()
+    cache_bus.stop()
     client.close()
+    password_executor.shutdown(wait=False)
@@ -5,6 +5,11 @@ Tests: seed data, auth (customer + admin), menu, plans, orders, subscriptions
 import pytest
 import requests
 import os
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -13,6 +18,25 @@ frontend_env = Path(__file__).parent.parent.parent / 'frontend' / '.env'
 load_dotenv(frontend_env)
 
 BASE_URL = os.environ.get('EXPO_PUBLIC_BACKEND_URL', 'https://daily-mess-box.preview.emergentagent.com')
+# CACHE_BUS_MAX_STALENESS_SECONDS of the server under test, plus headroom for the poll interval
+STALENESS_BOUND_SECONDS = float(os.environ.get('STALENESS_BOUND_SECONDS', '3'))
+# ARCHIVE_AFTER_DAYS of the server under test
+ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))
+
+def read_events(response, seconds=10):
+    """Parse a server-sent event stream into {"id", "event", "data"} dicts for up to `seconds`"""
+    deadline = time.monotonic() + seconds
+    event = {}
+    for line in response.iter_lines(chunk_size=1, decode_unicode=True):
+        if line and not line.startswith(":"):
+            field, _, value = line.partition(":")
+            event[field] = value.lstrip()
+        elif not line and event:
+            yield event
+            event = {}
+        if time.monotonic() > deadline:
+            return
+
 
 class TestSeedData:
     """Test seed data creation"""
@@ -26,6 +50,44 @@ class TestSeedData:
         print(f"✓ Seed endpoint working: {data['message']}")
 
 
+class TestHealth:
+    """Test the health endpoint"""
+    
+    def test_health_reports_pool(self):
+        """GET /api/health should ping Mongo and report connection pool occupancy"""
+        response = requests.get(f"{BASE_URL}/api/health")
+        assert response.status_code == 200, f"Health check failed: {response.text}"
+        
+        data = response.json()
+        assert data["status"] == "ok"
+        assert data["pool"]["checked_out"] <= data["pool"]["max_pool_size"]
+        print(f"✓ Mongo ping {data['mongo']['ping_ms']} ms, {data['pool']['checked_out']} connections checked out")
+
+
+class TestMetrics:
+    """Test the Prometheus metrics endpoint"""
+    
+    def test_metrics_exposition(self):
+        """GET /metrics should report per-route request counts and latency, size and Mongo call histograms"""
+        # One keep-alive connection, so the worker that served the request also renders its metrics
+        session = requests.Session()
+        assert session.get(f"{BASE_URL}/api/plans").status_code == 200
+        response = session.get(f"{BASE_URL}/metrics")
+        if response.status_code == 404:
+            pytest.skip("METRICS_ENABLED is off on the server under test")
+        assert response.status_code == 200, f"Metrics failed: {response.text}"
+        assert response.headers["Content-Type"].startswith("text/plain")
+        
+        body = response.text
+        route = 'method="GET",route="/api/plans"'
+        assert f'http_requests_total{{{route},status="200"}}' in body
+        assert f'http_request_duration_seconds_bucket{{{route},le="+Inf"}}' in body
+        assert f"http_response_size_bytes_count{{{route}}}" in body
+        assert f"http_request_mongo_commands_count{{{route}}}" in body
+        assert "# TYPE mongo_commands_total counter" in body
+        print(f"✓ Metrics exposition: {len(body.splitlines())} lines")
+
+
 class TestAuthentication:
     """Test authentication flows - customer and admin login"""
     
@@ -122,6 +184,18 @@ class TestMenu:
         daily_items = [item for item in monday_items if item.get("day_of_week") == "daily"]
         print(f"✓ Weekly menu has {len(daily_items)} daily items")
         print(f"✓ Weekly menu endpoint working with all 7 days")
+    
+    def test_weekly_menu_etag_not_modified(self):
+        """GET /api/menu/weekly with a matching If-None-Match should return 304"""
+        response = requests.get(f"{BASE_URL}/api/menu/weekly")
+        assert response.status_code == 200
+        etag = response.headers.get("ETag")
+        assert etag, "Weekly menu should carry an ETag"
+        
+        cached = requests.get(f"{BASE_URL}/api/menu/weekly", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        print(f"✓ Weekly menu revalidated with ETag {etag}")
 
 
 class TestPlans:
@@ -163,7 +237,7 @@ class TestOrders:
         """POST /api/orders should create an order"""
         headers = {"Authorization": f"Bearer {customer_token}"}
         order_data = {
-            "items": [{"name": "TEST Lunch Tiffin", "qty": 1, "price": 80}],
+            "items": [{"name": "Lunch Tiffin", "qty": 1, "price": 80}],
             "total": 80,
             "order_type": "single",
             "delivery_address": "Test Address",
@@ -202,7 +276,83 @@ class TestOrders:
         data = response.json()
         assert isinstance(data, list)
         assert len(data) > 0, "User should have orders (from seed + test)"
+        assert "delivery_address" not in data[0] and "items" not in data[0], "Lists should default to summary fields"
+        assert {"id", "status", "total", "created_at"} <= set(data[0])
+
+        detailed = requests.get(f"{BASE_URL}/api/orders", params={"fields": "items"}, headers=headers).json()
+        assert "items" in detailed[0] and "status" in detailed[0], "?fields= should add to the summary fields"
         print(f"✓ User orders endpoint returned {len(data)} orders")
+    
+    def test_create_order_idempotency_key(self, customer_token):
+        """Retrying POST /api/orders with the same Idempotency-Key should not create a second order"""
+        headers = {"Authorization": f"Bearer {customer_token}", "Idempotency-Key": f"TEST-{uuid.uuid4()}"}
+        order_data = {
+            "items": [{"name": "Lunch Tiffin", "qty": 1, "price": 80}],
+            "total": 80,
+            "order_type": "single",
+        }
+        first = requests.post(f"{BASE_URL}/api/orders", json=order_data, headers=headers)
+        retry = requests.post(f"{BASE_URL}/api/orders", json=order_data, headers=headers)
+        assert first.status_code == 200, f"Create order failed: {first.text}"
+        assert retry.status_code == 200
+        assert retry.json()["id"] == first.json()["id"], "Retry should replay the original order"
+        
+        changed = requests.post(f"{BASE_URL}/api/orders", json={**order_data, "total": 90}, headers=headers)
+        assert changed.status_code == 422, "Reusing a key for a different request should be rejected"
+        print(f"✓ Idempotent retry returned order {first.json()['id']}")
+
+    def test_order_priced_on_server(self, customer_token):
+        """POST /api/orders should price items itself and reject a stale total or an unknown item"""
+        headers = {"Authorization": f"Bearer {customer_token}"}
+        order_data = {"items": [{"name": "Lunch Tiffin", "qty": 2, "price": 1}], "order_type": "single"}
+        response = requests.post(f"{BASE_URL}/api/orders", json=order_data, headers=headers)
+        assert response.status_code == 200, f"Create order failed: {response.text}"
+        assert response.json()["total"] == 160, "Client-sent unit prices must be ignored"
+        
+        stale = requests.post(f"{BASE_URL}/api/orders", json={**order_data, "total": 2}, headers=headers)
+        assert stale.status_code == 409
+        unknown = requests.post(f"{BASE_URL}/api/orders", json={"items": [{"name": "TEST Free Lunch", "qty": 1}]}, headers=headers)
+        assert unknown.status_code == 400
+        print(f"✓ Order priced server-side at {response.json()['total']}")
+
+    def test_concurrent_orders_each_get_their_own_result(self, customer_token):
+        """A burst of order creations (coalesced when ORDER_INSERT_BATCHING is on) must all succeed separately"""
+        headers = {"Authorization": f"Bearer {customer_token}"}
+        order_data = {"items": [{"name": "Lunch Tiffin", "qty": 1}], "order_type": "single"}
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            responses = list(pool.map(
+                lambda _: requests.post(f"{BASE_URL}/api/orders", json=order_data, headers=headers), range(20)
+            ))
+        assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200]
+        ids = {r.json()["id"] for r in responses}
+        assert len(ids) == 20
+        for order_id in list(ids)[:3]:
+            assert requests.get(f"{BASE_URL}/api/orders/{order_id}", headers=headers).status_code == 200
+        print(f"✓ {len(ids)} concurrent orders created")
+
+    def test_order_timestamps_are_utc_iso(self, customer_token):
+        """Timestamps are stored as dates but must still reach clients as ISO strings with a UTC offset"""
+        headers = {"Authorization": f"Bearer {customer_token}"}
+        order_data = {"items": [{"name": "Lunch Tiffin", "qty": 1, "price": 80}], "total": 80, "order_type": "single"}
+        created = requests.post(f"{BASE_URL}/api/orders", json=order_data, headers=headers).json()
+        fetched = requests.get(f"{BASE_URL}/api/orders/{created['id']}", headers=headers).json()
+        assert fetched["created_at"] == created["created_at"]
+        assert datetime.fromisoformat(fetched["created_at"]).utcoffset() == timedelta(0)
+        print(f"✓ Order created_at {fetched['created_at']}")
+
+    def test_home_bundle(self, customer_token):
+        """GET /api/home should match the separate menu and plans endpoints"""
+        headers = {"Authorization": f"Bearer {customer_token}"}
+        response = requests.get(f"{BASE_URL}/api/home", params={"day": "monday"}, headers=headers)
+        assert response.status_code == 200, f"Home bundle failed: {response.text}"
+
+        data = response.json()
+        assert data["user"]["email"] == "rahul@test.com"
+        assert "password_hash" not in data["user"]
+        assert data["menu"] == requests.get(f"{BASE_URL}/api/menu", params={"day": "monday"}).json()
+        assert len(data["plans"]) == len(requests.get(f"{BASE_URL}/api/plans").json())
+        assert len(data["recent_orders"]) <= 5
+        print(f"✓ Home bundle: {len(data['menu'])} dishes, {len(data['recent_orders'])} recent orders")
 
 
 class TestPayment:
@@ -340,4 +490,280 @@ class TestAdminEndpoints:
         headers = {"Authorization": f"Bearer {customer_token}"}
         response = requests.get(f"{BASE_URL}/api/admin/dashboard", headers=headers)
         assert response.status_code == 403, "Customer should not access admin endpoints"
-        print(f"✓ Admin endpoints properly protected")
+        print("✓ Admin endpoints properly protected")
+    
+    def test_admin_cache_stats(self, admin_token):
+        """GET /api/admin/cache-stats should report user cache hit/miss counters"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        requests.get(f"{BASE_URL}/api/auth/me", headers=headers)
+        response = requests.get(f"{BASE_URL}/api/admin/cache-stats", headers=headers)
+        assert response.status_code == 200, f"Cache stats failed: {response.text}"
+        
+        users = response.json()["users"]
+        assert users["size"] <= users["max_size"]
+        assert users["hits"] + users["misses"] > 0
+        print(f"✓ User cache: {users['hits']} hits, {users['misses']} misses")
+    
+    def test_admin_index_usage(self, admin_token):
+        """GET /api/admin/indexes should report declared indexes as present"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/admin/indexes", headers=headers)
+        assert response.status_code == 200, f"Index usage failed: {response.text}"
+        
+        data = response.json()
+        for collection in ("users", "orders", "subscriptions", "menu_items"):
+            assert collection in data
+            assert data[collection]["missing"] == [], f"{collection} is missing indexes"
+        print(f"✓ Index usage reported for {len(data)} collections")
+    
+    def test_all_orders_cursor_pagination(self, admin_token):
+        """GET /api/orders/all should page with limit/after without repeating orders"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        first = requests.get(f"{BASE_URL}/api/orders/all", params={"limit": 1, "fields": "status,total"}, headers=headers)
+        assert first.status_code == 200, f"Paged orders failed: {first.text}"
+        page = first.json()
+        assert len(page) == 1
+        assert "items" not in page[0], "Projection should drop unrequested fields"
+        
+        cursor = first.headers.get("X-Next-Cursor")
+        assert cursor, "Seeded data should span more than one page"
+        second = requests.get(f"{BASE_URL}/api/orders/all", params={"limit": 1, "after": cursor}, headers=headers)
+        assert second.status_code == 200
+        assert second.json()[0]["id"] != page[0]["id"]
+        print("✓ Cursor pagination returned distinct pages")
+
+    def test_order_status_transitions(self, admin_token):
+        """Status changes must follow the state machine, singly or in bulk with per-id results"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        login = requests.post(f"{BASE_URL}/api/auth/login", json={"email": "rahul@test.com", "password": "test123"})
+        customer = {"Authorization": f"Bearer {login.json()['token']}"}
+        order_data = {"items": [{"name": "Lunch Tiffin", "qty": 1}], "order_type": "single"}
+        ids = [requests.post(f"{BASE_URL}/api/orders", json=order_data, headers=customer).json()["id"] for _ in range(2)]
+
+        skipped = requests.put(f"{BASE_URL}/api/orders/{ids[0]}/status", json={"status": "delivered"}, headers=headers)
+        assert skipped.status_code == 409, "pending -> delivered must be rejected"
+
+        response = requests.put(
+            f"{BASE_URL}/api/orders/status",
+            json={"order_ids": ids + ["TEST-missing"], "status": "preparing"}, headers=headers
+        )
+        assert response.status_code == 200, f"Bulk status update failed: {response.text}"
+        data = response.json()
+        assert data["updated"] == 2
+        assert data["results"] == {ids[0]: "updated", ids[1]: "updated", "TEST-missing": "not_found"}
+
+        cancelled = requests.put(f"{BASE_URL}/api/orders/{ids[1]}/status", json={"status": "cancelled"}, headers=headers)
+        assert cancelled.status_code == 200
+        assert cancelled.json()["status"] == "cancelled"
+        print(f"✓ Bulk status update: {data['results']}")
+
+    def test_admin_stats_reconcile(self, admin_token):
+        """POST /api/admin/stats/reconcile should recompute stats and report drift"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.post(f"{BASE_URL}/api/admin/stats/reconcile", headers=headers)
+        assert response.status_code == 200, f"Reconcile failed: {response.text}"
+        
+        data = response.json()
+        assert "drift" in data
+        assert data["dashboard"]["total_orders"] >= data["dashboard"]["pending_orders"]
+        
+        # Straight after a reconcile the dashboard must agree with it
+        dashboard = requests.get(f"{BASE_URL}/api/admin/dashboard", headers=headers).json()
+        assert dashboard["total_orders"] == data["dashboard"]["total_orders"]
+        print(f"✓ Stats reconciled, drift fields: {list(data['drift'])}")
+
+    def test_admin_kitchen_forecast(self, admin_token):
+        """GET /api/admin/forecast should return per-dish portions for each requested day"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/admin/forecast", params={"days": 3}, headers=headers)
+        assert response.status_code == 200, f"Forecast failed: {response.text}"
+
+        data = response.json()
+        assert len(data["forecast"]) == 3
+        for day in data["forecast"]:
+            assert day["total_meals"] >= day["subscription_meals"]
+            assert all(dish["portions"] == day["total_meals"] for dish in day["dishes"])
+        print(f"✓ Forecast: {[day['total_meals'] for day in data['forecast']]} meals")
+
+    def test_admin_delivery_manifest(self, admin_token):
+        """Building manifests then reading today's should group deliveries by area"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.post(f"{BASE_URL}/api/admin/manifests/build", headers=headers)
+        assert response.status_code == 200, f"Manifest build failed: {response.text}"
+        today = response.json()["manifests"][0]
+
+        response = requests.get(f"{BASE_URL}/api/admin/manifests/{today['date']}", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_deliveries"] == today["deliveries"]
+        assert sum(len(area["stops"]) for area in data["areas"]) == data["total_deliveries"]
+        print(f"✓ Manifest {data['date']}: {data['total_deliveries']} deliveries in {len(data['areas'])} areas")
+
+    def test_admin_export_orders_csv(self, admin_token):
+        """GET /api/admin/export/orders should stream a CSV with a header row"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(
+            f"{BASE_URL}/api/admin/export/orders",
+            params={"format": "csv", "status": "delivered", "date_from": "2024-01-01"},
+            headers=headers,
+        )
+        assert response.status_code == 200, f"Export failed: {response.text}"
+        assert response.headers["content-type"].startswith("text/csv")
+        
+        lines = response.text.splitlines()
+        assert lines[0].startswith("id,created_at")
+        assert all(",delivered," in line for line in lines[1:])
+        print(f"✓ Exported {len(lines) - 1} delivered orders")
+
+    def test_cache_bus_stays_in_sync_under_traffic(self, admin_token):
+        """Steady cache bus traffic must not make workers fall out of sync and bypass their caches"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        bus = requests.get(f"{BASE_URL}/api/admin/cache-stats", headers=headers).json()["cache_bus"]
+        if not bus["enabled"]:
+            pytest.skip("CACHE_BUS_ENABLED is off on the server under test")
+        item = requests.post(f"{BASE_URL}/api/menu", json={
+            "name_en": "TEST Bus Traffic Dish", "name_mr": "चाचणी", "category": "extra", "day_of_week": "daily",
+        }, headers=headers).json()
+        try:
+            # Every menu write publishes a bus event; keep them coming for several staleness bounds
+            deadline = time.monotonic() + 3 * STALENESS_BOUND_SECONDS
+            checks = 0
+            while time.monotonic() < deadline:
+                marker = f"TEST Bus Traffic {uuid.uuid4().hex[:8]}"
+                requests.put(f"{BASE_URL}/api/menu/{item['id']}", json={"name_en": marker}, headers=headers)
+                # Fresh connections so the checks spread across worker processes
+                bus = requests.get(
+                    f"{BASE_URL}/api/admin/cache-stats", headers={**headers, "Connection": "close"}
+                ).json()["cache_bus"]
+                assert bus["in_sync"], f"A worker fell out of sync under bus traffic: {bus}"
+                checks += 1
+        finally:
+            requests.delete(f"{BASE_URL}/api/menu/{item['id']}", headers=headers)
+        print(f"✓ Cache bus stayed in sync across {checks} checks under traffic")
+
+    def test_menu_item_reprices_orders(self, admin_token):
+        """A priced menu item should be orderable by name, and a price change should apply to new orders"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        # A unique name, so other tests and real orders on the server keep their prices
+        name = f"TEST Meal {uuid.uuid4().hex[:8]}"
+        item = requests.post(f"{BASE_URL}/api/menu", json={
+            "name_en": name, "name_mr": "चाचणी", "category": "extra", "day_of_week": "daily", "price": 95,
+        }, headers=headers).json()
+        order_data = {"items": [{"name": name, "qty": 1}], "order_type": "single"}
+        try:
+            time.sleep(STALENESS_BOUND_SECONDS)
+            order = requests.post(f"{BASE_URL}/api/orders", json=order_data, headers=headers)
+            assert order.status_code == 200, f"Create order failed: {order.text}"
+            assert order.json()["total"] == 95
+
+            requests.put(f"{BASE_URL}/api/menu/{item['id']}", json={"price": 105}, headers=headers)
+            time.sleep(STALENESS_BOUND_SECONDS)
+            order = requests.post(f"{BASE_URL}/api/orders", json=order_data, headers=headers)
+            assert order.status_code == 200, f"Create order failed: {order.text}"
+            assert order.json()["total"] == 105, "New orders must use the updated price"
+        finally:
+            requests.delete(f"{BASE_URL}/api/menu/{item['id']}", headers=headers)
+        print(f"✓ {name} repriced from the menu at {order.json()['total']}")
+
+    def test_menu_delta_sync(self, admin_token):
+        """GET /api/menu?since= should return only changes since the watermark, including deletions"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        full = requests.get(f"{BASE_URL}/api/menu", headers={"Origin": "http://localhost:8081"})
+        watermark = full.headers.get("X-Sync-Watermark")
+        assert watermark, "Full menu responses must carry a sync watermark"
+        assert "X-Sync-Watermark" in full.headers.get("Access-Control-Expose-Headers", "")
+
+        item = requests.post(f"{BASE_URL}/api/menu", json={
+            "name_en": "TEST Delta Dish", "name_mr": "चाचणी", "category": "extra", "day_of_week": "daily",
+        }, headers=headers).json()
+        # Clients append the watermark to the URL without encoding it
+        delta = requests.get(f"{BASE_URL}/api/menu?since={watermark}").json()
+        assert item["id"] in [i["id"] for i in delta["changed"]]
+
+        requests.delete(f"{BASE_URL}/api/menu/{item['id']}", headers=headers)
+        delta = requests.get(f"{BASE_URL}/api/menu", params={"since": delta["watermark"]}).json()
+        assert item["id"] in delta["deleted"]
+        assert delta["reset"] is False
+        print(f"✓ Menu delta: {len(delta['changed'])} changed, {len(delta['deleted'])} deleted")
+
+    def test_archive_keeps_dashboard_totals(self, admin_token):
+        """POST /api/admin/archive/run moves old settled orders out without changing dashboard totals"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        before = requests.get(f"{BASE_URL}/api/admin/dashboard", headers=headers).json()
+        response = requests.post(f"{BASE_URL}/api/admin/archive/run", headers=headers)
+        assert response.status_code == 200, f"Archive run failed: {response.text}"
+        
+        after = requests.get(f"{BASE_URL}/api/admin/dashboard", headers=headers).json()
+        assert after["total_orders"] == before["total_orders"]
+        assert after["total_revenue"] == before["total_revenue"]
+        print(f"✓ Archived {response.json()['archived']} orders, dashboard unchanged")
+
+    def test_restored_order_is_a_status_change_in_feed(self, admin_token):
+        """Cancelling an archived order should reach the order feed as a status change, not a new order"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        requests.post(f"{BASE_URL}/api/admin/archive/run", headers=headers)
+        cutoff = datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)
+        delivered = requests.get(f"{BASE_URL}/api/orders/all", params={
+            "status": "delivered", "limit": 1000, "fields": "updated_at",
+        }, headers=headers).json()
+        archived = [o for o in delivered if datetime.fromisoformat(o["updated_at"].replace("Z", "+00:00")) < cutoff]
+        if not archived:
+            pytest.skip("No delivered order old enough to be archived")
+        order = archived[-1]
+
+        with requests.get(f"{BASE_URL}/api/orders/feed", headers=headers, stream=True, timeout=20) as feed:
+            events = read_events(feed)
+            assert next(events)["event"] == "hello"
+            response = requests.put(f"{BASE_URL}/api/orders/{order['id']}/status", json={"status": "cancelled"}, headers=headers)
+            assert response.status_code == 200, f"Cancel archived order failed: {response.text}"
+            ours = next((e for e in events if e["event"] in ("insert", "status") and json.loads(e["data"])["id"] == order["id"]), None)
+        assert ours and ours["event"] == "status", "A restored order must not be announced as a new order"
+        assert json.loads(ours["data"])["status"] == "cancelled"
+        print(f"✓ Restored order {order['id']} pushed as a status change")
+
+    def test_admin_analytics_buckets(self, admin_token):
+        """GET /api/admin/analytics should return continuous buckets whose sums match the totals"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/admin/analytics", params={"granularity": "week"}, headers=headers)
+        assert response.status_code == 200, f"Analytics failed: {response.text}"
+        
+        data = response.json()
+        assert len(data["buckets"]) == 12
+        assert sum(b["orders"] for b in data["buckets"]) == data["totals"]["orders"]
+        assert sum(b["revenue"] for b in data["buckets"]) == data["totals"]["revenue"]
+        monthly = requests.get(f"{BASE_URL}/api/admin/analytics", params={"granularity": "month"}, headers=headers).json()
+        assert monthly["buckets"][-1]["orders"] >= 1, "Seeded orders from this month should be counted"
+        print(f"✓ Analytics: {data['totals']['orders']} orders over 12 weeks")
+
+    def test_order_feed_resumes_after_last_event_id(self, admin_token):
+        """GET /api/orders/feed should push new orders and replay what was missed after Last-Event-ID"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        order_data = {"items": [{"name": "Lunch Tiffin", "qty": 1}], "order_type": "single"}
+        is_ours = lambda event, op: event["event"] == op and json.loads(event["data"])["id"] == order["id"]
+
+        with requests.get(f"{BASE_URL}/api/orders/feed", headers=headers, stream=True, timeout=20) as feed:
+            assert feed.status_code == 200, f"Order feed failed: {feed.text}"
+            assert feed.headers["Content-Type"].startswith("text/event-stream")
+            events = read_events(feed)
+            assert next(events)["event"] == "hello"
+            order = requests.post(f"{BASE_URL}/api/orders", json=order_data, headers=headers).json()
+            inserted = next((e for e in events if is_ours(e, "insert")), None)
+            assert inserted, "The new order should be pushed to a connected admin"
+
+        # Changed while disconnected: resuming replays it, or signals a reset if another worker answers
+        requests.put(f"{BASE_URL}/api/orders/{order['id']}/status", json={"status": "preparing"}, headers=headers)
+        resumed_headers = {**headers, "Last-Event-ID": inserted["id"]}
+        with requests.get(f"{BASE_URL}/api/orders/feed", headers=resumed_headers, stream=True, timeout=20) as feed:
+            events = read_events(feed)
+            assert next(events)["event"] == "hello"
+            missed = next((e for e in events if e["event"] == "reset" or is_ours(e, "status")), None)
+            assert missed, "Resuming should replay the missed status change"
+            if missed["event"] == "status":
+                assert json.loads(missed["data"])["status"] == "preparing"
+
+        stale_headers = {**headers, "Last-Event-ID": "gone-1"}
+        with requests.get(f"{BASE_URL}/api/orders/feed", headers=stale_headers, stream=True, timeout=20) as feed:
+            events = read_events(feed)
+            assert next(events)["event"] == "hello"
+            assert next(events)["event"] == "reset", "An unknown event id must make the client refetch"
+        print(f"✓ Order feed resumed after {inserted['id']} with {missed['event']}")
@@ -27,7 +27,8 @@ export default function AdminOrders() {
 
   const updateStatus = (orderId: string, currentStatus: string) => {
     const currentIdx = STATUSES.indexOf(currentStatus);
-    const nextStatuses = STATUSES.filter((_, i) => i > currentIdx && i < STATUSES.length);
+    // The backend only allows the next step, or cancelling
+    const nextStatuses = currentIdx < 0 || currentStatus === 'cancelled' ? [] : Array.from(new Set([STATUSES[currentIdx + 1], 'cancelled']));
     if (nextStatuses.length === 0) return;
 
     Alert.alert('Update Status', 'Select new status', [
@@ -62,10 +62,10 @@ class ApiClient {
     return this.request('/orders', { method: 'POST', body: JSON.stringify(body) });
   }
   getOrders() {
-    return this.request('/orders');
+    return this.request('/orders?fields=items.name,items.qty');
   }
   getAllOrders(status?: string) {
-    return this.request(`/orders/all${status ? `?status=${status}` : ''}`);
+    return this.request(`/orders/all?fields=items.name,items.qty,user_phone${status ? `&status=${status}` : ''}`);
   }
   getOrder(id: string) {
     return this.request(`/orders/${id}`);